@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+__description__ = 'Benchmark the scan, validate, copy, hash and verify stages of Cirdan on a synthetic source tree'
+
+import logging
+from argparse import ArgumentParser
+from json import dump, dumps
+from random import Random
+from string import ascii_uppercase, ascii_lowercase, digits
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from shutil import rmtree
+from classes.paths import Path, PathTree
+from classes.json import Json
+from classes.config import Config
+from classes.settings import Settings
+from classes.logger import Logger
+from classes.hash import HashThread
+from classes.verify import VerifyPool
+from classes.backend import create_backend
+from classes.throttle import Throttle
+from classes.worker import Worker
+
+__parent_path__ = Path(__file__).parent
+
+def generate_tree(root, files, min_size, max_size, distribution, depth, name_length, seed):
+	'''Generate source tree that matches the default source whitelist (e.g. 123456-benchmark/EAV0123456789/...)'''
+	rng = Random(seed)
+	block = rng.randbytes(1048576)
+	def name(length, chars=ascii_lowercase+digits):
+		return ''.join(rng.choice(chars) for _ in range(length))
+	dir_paths = list()
+	for index in range(max(1, files // 1000)):
+		dir_path = root.joinpath(f'EAV{"".join(rng.choice(ascii_uppercase+digits) for _ in range(9))}')
+		for level in range(depth):
+			dir_path = dir_path.joinpath(name(name_length))
+		dir_path.mkdir(parents=True, exist_ok=True)
+		dir_paths.append(dir_path)
+	total_bytes = 0
+	for index in range(files):
+		if distribution == 'lognormal':	# many small and few huge files
+			size = int(min(max_size, max(min_size, rng.lognormvariate(0, 2) * min_size)))
+		else:
+			size = rng.randint(min_size, max_size)
+		with dir_paths[index % len(dir_paths)].joinpath(f'{name(name_length)}.pdf').open('wb') as fh:
+			left = size
+			while left > 0:
+				offset = rng.randrange(len(block))
+				chunk = block[offset:offset+left]
+				fh.write(chunk)
+				left -= len(chunk)
+		total_bytes += size
+	return total_bytes
+
+class Benchmark:
+	'''Measure stages and keep results'''
+
+	def __init__(self, files, total_bytes):
+		'''Set size of tree'''
+		self._files = files
+		self._bytes = total_bytes
+		self.results = dict()
+
+	def measure(self, name, function, *args, data=True, **kwargs):
+		'''Run function and store duration, data=True if all bytes of the tree are processed'''
+		print(f'Running {name}...', end=' ', flush=True)
+		start = perf_counter()
+		result = function(*args, **kwargs)
+		seconds = perf_counter() - start
+		self.results[name] = {'seconds': seconds, 'files': self._files}
+		if data:
+			self.results[name]['bytes'] = self._bytes
+			self.results[name]['mb_per_s'] = self._bytes / seconds / 1000000 if seconds else None
+		print(f'{seconds:.3f} s')
+		return result
+
+def hash_files(file_paths, workers, buffer_size, algorithms):
+	'''Hash files with HashThread and wait'''
+	hash_thread = HashThread(file_paths, workers=workers, buffer_size=buffer_size, algorithms=algorithms)
+	hash_thread.start()
+	hash_thread.join()
+	return list(hash_thread.get_hashes())
+
+def copy_files(backend, source, destination):
+	'''Run copy backend and consume its output'''
+	for line in backend.copy_dir(source, destination):
+		pass
+	return backend.returncode
+
+def size_check(source, destination):
+	'''Compare sizes of source and destination manifests like the Worker does'''
+	dst_manifest = destination.scan()
+	return [relative for relative, size, mtime in source.manifest.files() if dst_manifest.get_size(relative) != size]
+
+def verify_files(source, destination, hashes, workers, buffer_size, algorithm):
+	'''Hash destination files with VerifyPool and compare first digest'''
+	verify_pool = VerifyPool(workers=workers, buffer_size=buffer_size, algorithm=algorithm)
+	futures = {
+		path: verify_pool.verify(destination.joinpath(source.get_relative(path)), digests[0]) for path, digests in hashes
+	}
+	mismatches = {path for path, future in futures.items() if not future.result()}
+	verify_pool.shutdown()
+	return mismatches
+
+if __name__ == '__main__':  # start here when run as application
+	argparser = ArgumentParser(description=__description__)
+	argparser.add_argument('-a', '--algorithms', type=str, nargs='+', metavar='ALGORITHM',
+		help='Hash algorithms to build in one read (default: hash_algorithms from config.json)')
+	argparser.add_argument('-b', '--backend', type=str, default='native', choices=('python', 'native', 'robocopy'),
+		help='Copy backend (default: native as local stand-in for robocopy)')
+	argparser.add_argument('-d', '--depth', type=int, default=3, metavar='INTEGER',
+		help='Number of sub directory levels (default: 3)')
+	argparser.add_argument('-f', '--files', type=int, default=1000, metavar='INTEGER',
+		help='Number of files (default: 1000)')
+	argparser.add_argument('-l', '--namelength', type=int, default=20, metavar='INTEGER',
+		help='Length of file and directory names (default: 20)')
+	argparser.add_argument('-m', '--minsize', type=int, default=1024, metavar='BYTES',
+		help='Minimal file size (default: 1024)')
+	argparser.add_argument('-M', '--maxsize', type=int, default=1048576, metavar='BYTES',
+		help='Maximal file size (default: 1048576)')
+	argparser.add_argument('-o', '--output', type=str, metavar='FILE',
+		help='JSON file to write results (default: print only)')
+	argparser.add_argument('-r', '--root', type=str, metavar='DIRECTORY',
+		help='Directory for the synthetic trees (default: temporary directory)')
+	argparser.add_argument('-s', '--seed', type=int, default=0, metavar='INTEGER',
+		help='Seed for random generator (default: 0)')
+	argparser.add_argument('-u', '--uniform', action='store_true',
+		help='Uniform size distribution (default: lognormal, many small and few huge files)')
+	args = argparser.parse_args()
+	with TemporaryDirectory(dir=args.root) as tmp_dir:
+		tmp_path = Path(tmp_dir)
+		config = Config(__parent_path__)
+		for key in 'local_path', 'log_path', 'mail_path':
+			config.__dict__[key] = tmp_path.joinpath(key)
+			config.__dict__[key].mkdir()
+		config.target_path = tmp_path.joinpath('target')
+		config.destinations = {'benchmark': 'import'}
+		config.target_path.joinpath('import').mkdir(parents=True)
+		config.copy_backend = args.backend
+		if args.algorithms:
+			config.hash_algorithms = args.algorithms
+		config.manifest_cache = False
+		src_path = tmp_path.joinpath('source', '123456-benchmark')
+		print(f'Generating {args.files} file(s) in {src_path}...', end=' ', flush=True)
+		total_bytes = generate_tree(src_path, args.files, args.minsize, args.maxsize,
+			'uniform' if args.uniform else 'lognormal', args.depth, args.namelength, args.seed)
+		print(f'{total_bytes} bytes')
+		benchmark = Benchmark(args.files, total_bytes)
+		source = benchmark.measure('scan', PathTree, src_path, data=False)
+		benchmark.measure('whitelist', source.search, config.source_whitelist, data=False)
+		benchmark.measure('blacklist', source.search, config.source_blacklist, data=False)
+		benchmark.measure('too_long', source.too_long, config.max_path_length, data=False)
+		file_paths = [path for path, size in source.files()]
+		hashes = benchmark.measure('hash', hash_files, file_paths, config.hash_workers, config.hash_buffer_size, config.hash_algorithms)
+		backend = create_backend(config.copy_backend,
+			profile = config.robocopy_profiles[config.robocopy_profile],
+			throttle = Throttle(config.bandwidth, config.bandwidth_schedule),
+			buffer_size = config.hash_buffer_size,
+			chunk_threshold = config.chunk_threshold,
+			chunk_size = config.chunk_size,
+			chunk_threads = config.chunk_threads,
+			algorithms = config.hash_algorithms
+		)
+		destination = PathTree(config.target_path.joinpath('import', source.name))
+		benchmark.measure('copy', copy_files, backend, source, destination)
+		benchmark.measure('size_check', size_check, source, destination, data=False)
+		benchmark.measure('verify', verify_files, source, destination, hashes, config.verify_workers, config.hash_buffer_size,
+			config.hash_algorithms[0])
+		rmtree(destination.path)
+		labels = Json(config.labels_path)
+		labels.version = 'benchmark'
+		labels.user = 'benchmark'
+		settings = Settings(config)
+		settings.destination = 'benchmark'
+		settings.tolerant = True
+		settings.sendmail = False
+		quiet = lambda *args, end=None: None
+		logger = Logger(config, labels, echo=quiet)
+		worker = Worker([src_path], config, labels, settings, backend, logger, echo=quiet)
+		errors = benchmark.measure('end_to_end', worker.run)
+		logger.close()
+		logging.shutdown()
+		results = {
+			'parameters': vars(args),
+			'tree': {'files': args.files, 'bytes': total_bytes},
+			'stages': benchmark.results,
+			'errors': errors
+		}
+	if args.output:
+		with Path(args.output).open('w', encoding='utf-8') as fp:
+			dump(results, fp, indent=4)
+	else:
+		print(dumps(results, indent=4))
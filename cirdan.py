@@ -16,23 +16,26 @@ from classes.paths import Path
 from classes.json import Json
 from classes.config import Config
 from classes.settings import Settings
-from classes.logger import Logger
-from classes.robocopy import RoboCopy
-from classes.worker import Worker
-from classes.gui import Gui
+from classes.spool import Spool
 
 __parent_path__ = Path(__file__).parent if Path(__executable__).name == 'python.exe' else Path(__executable__).parent
 
 if __name__ == '__main__':  # start here when run as application
 	argparser = ArgumentParser(description=__description__)
+	argparser.add_argument('-b', '--batch', action='store_true',
+		help='Run as headless service that processes jobs from the spool directory')
 	argparser.add_argument('-d', '--destination', type=str, metavar='STRING',
 		help='Destination to copy to')
 	argparser.add_argument('-g', '--gui', action='store_true',
 		help='Use GUI with given root directory as command line parameters')
+	argparser.add_argument('-j', '--job', action='store_true',
+		help='Submit source directory as job to the spool directory of the service instead of copying')
 	argparser.add_argument('-l', '--log', type=str, metavar='FILE',
 		help='File to store log')
 	argparser.add_argument('-n', '--notrigger', action='store_true',
 		help='Do not triggedr further process to handle/move uploaded data')
+	argparser.add_argument('-p', '--profile', type=str, metavar='FILE',
+		help='Write cProfile statistics of the copy process to given file (all threads, use internal time)')
 	argparser.add_argument('-q', '--qualicheck', action='store_true',
 		help='Trigger qualicheck when the entire process has finished')
 	argparser.add_argument('-s', '--sendmail', action='store_true',
@@ -61,10 +64,28 @@ if __name__ == '__main__':  # start here when run as application
 		settings.user = args.user.strip('"\'')
 	source_path = Path(args.source.strip('"\'')).resolve() if args.source else None
 	settings.tolerant = args.tolerant
-	if source_path and not args.gui:
-		logger = Logger(config, labels)
+	if args.job:
 		if not source_path:
-			logger.error(labels.missing_source_dir)
+			print(labels.missing_source)
+			sys_exit(1)
+		job_path = Spool(config.spool_path).submit(
+			source = f'{source_path}',
+			destination = settings.destination,
+			user = settings.user,
+			trigger = settings.trigger,
+			qualicheck = args.qualicheck,
+			sendmail = args.sendmail,
+			tolerant = args.tolerant
+		)
+		print(labels.job_submitted.replace('#', f'{job_path}'))
+		sys_exit(0)
+	if args.batch or source_path and not args.gui:	# headless, GUI and tkinter are not imported
+		from classes.logger import Logger
+		from classes.backend import create_backend
+		from classes.throttle import Throttle
+		logger = Logger(config, labels)
+		if not source_path and not args.batch:
+			logger.error(labels.missing_source)
 			sys_exit(1)
 		if not config.log_path.is_accessable_dir():
 			logger.error(labels.bad_log_dir.replace('#', f'{config.log_path}'))
@@ -78,7 +99,31 @@ if __name__ == '__main__':  # start here when run as application
 			settings.save()
 		except Exception as ex:
 			logger.warning(ex)
-		if Worker([source_path], config, labels, settings, RoboCopy(), logger, user_log=log_path).run():
+		backend = create_backend(config.copy_backend,
+			profile = config.robocopy_profiles[config.robocopy_profile],
+			throttle = Throttle(config.bandwidth, config.bandwidth_schedule),
+			probe_cache = config.local_path / config.probe_cache_name,
+			buffer_size = config.hash_buffer_size,
+			chunk_threshold = config.chunk_threshold,
+			chunk_size = config.chunk_size,
+			chunk_threads = config.chunk_threads,
+			algorithms = config.hash_algorithms
+		)
+		if args.batch:
+			from classes.daemon import Daemon
+			Daemon(config, labels, settings, backend, logger).run()
+			sys_exit(0)
+		from classes.worker import Worker
+		worker = Worker([source_path], config, labels, settings, backend, logger, user_log=log_path)
+		if args.profile:	# since Python 3.12 cProfile also records the thread pools, cumulative times of interleaved calls are not reliable
+			from cProfile import Profile
+			profile = Profile()
+			errors = profile.runcall(worker.run)
+			profile.dump_stats(args.profile.strip('"\''))
+		else:
+			errors = worker.run()
+		if errors:
 			sys_exit(1)
 		sys_exit(0)
+	from classes.gui import Gui
 	Gui(config, labels, settings, user_log=log_path, source=source_path).mainloop()
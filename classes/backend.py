@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+class CopyBackend:
+	'''Interface of copy backends used by the Worker
+
+	copy_dir, mirror_dir and copy_files return iterators over output lines in
+	the format of robocopy /fp /ns /nc (full path of each file, percent lines),
+	returncode is set when an iterator is exhausted (robocopy semantics, > 7 means failure)
+	'''
+
+	hash_while_copy = False	# True if the backend stores digests in the manifest of the source tree while copying
+	throttle = None	# Throttle shared with hashing and verification
+	ordered_output = True	# a file line is printed only when the previous file is complete
+
+	def copy_dir(self, src, dst):
+		'''Copy recursivly a directory'''
+		raise NotImplementedError
+
+	def mirror_dir(self, src, dst):
+		'''Empty destination directory and copy source into it'''
+		raise NotImplementedError
+
+	def copy_files(self, src, dst, filenames):
+		'''Copy files into destination directory'''
+		raise NotImplementedError
+
+	def terminate(self):
+		'''Stop running copy process'''
+		raise NotImplementedError
+
+	def clone(self):
+		'''Return new object with the same settings for another job'''
+		raise NotImplementedError
+
+def create_backend(name='robocopy', profile=None, throttle=None, probe_cache=None, **options):
+	'''Return copy backend by name, modules are imported only when used,
+		profile and probe_cache are passed to robocopy, options (e.g. buffer_size, chunk_threshold, algorithms) to the Python engines
+	'''
+	if name == 'python':
+		from classes.pycopy import PyCopy
+		return PyCopy(throttle=throttle, **options)
+	if name == 'native':
+		from classes.nativecopy import NativeCopy
+		return NativeCopy(throttle=throttle, **options)
+	if name == 'robocopy':
+		from classes.robocopy import RoboCopy
+		return RoboCopy(profile, throttle=throttle, probe_cache=probe_cache)
+	raise ValueError(f'Unknown copy backend: {name}')
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from sqlite3 import connect
+from contextlib import closing
+
+class ManifestCache:
+	'''Persistent cache of file hashes to resume interrupted uploads (SQLite)'''
+
+	def __init__(self, path):
+		'''Open or create database'''
+		self._path = path
+		with closing(connect(self._path)) as db, db:
+			db.execute('''CREATE TABLE IF NOT EXISTS digests (
+				source TEXT NOT NULL,
+				relative TEXT NOT NULL,
+				size INTEGER NOT NULL,
+				mtime REAL NOT NULL,
+				algorithm TEXT NOT NULL,
+				digest TEXT NOT NULL,
+				PRIMARY KEY (source, relative, algorithm)
+			)''')
+
+	def load(self, source):
+		'''Yield (relative path, size, mtime, algorithm, hex digest) of given source directory'''
+		with closing(connect(self._path)) as db:
+			yield from db.execute('SELECT relative, size, mtime, algorithm, digest FROM digests WHERE source = ?', (f'{source}',))
+
+	def store(self, source, files, replace=True):
+		'''Store (relative path, size, mtime, algorithm, hex digest) items, replace all entries of the source by default'''
+		with closing(connect(self._path)) as db, db:
+			if replace:
+				db.execute('DELETE FROM digests WHERE source = ?', (f'{source}',))
+			db.executemany('INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?)',
+				((f'{source}', *item) for item in files)
+			)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from copy import copy
+from threading import Event
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from classes.paths import Path
+from classes.spool import Spool
+from classes.worker import Worker
+
+class Daemon:
+	'''Headless service that processes jobs from the spool directory with one initialized config and backend'''
+
+	def __init__(self, config, labels, settings, robocopy, logger, echo=print):
+		'''Prepare spool directory'''
+		self._config = config
+		self._labels = labels
+		self._settings = settings
+		self._robocopy = robocopy
+		self._logger = logger
+		self._echo = echo
+		self._spool = Spool(self._config.spool_path)
+		self._kill_switch = Event()
+
+	def _echo_line(self, msg, end=None):
+		'''Echo worker output without progress lines as jobs run concurrently'''
+		if end != '\r':
+			self._echo(msg)
+
+	def _run(self, path, job):
+		'''Copy one source directory as given in job file'''
+		self._logger.info(self._labels.job_started.replace('#', f'{path.name}'))
+		settings = copy(self._settings)
+		for key in 'destination', 'user', 'trigger', 'qualicheck', 'sendmail', 'tolerant':
+			if key in job:
+				settings.__dict__[key] = job[key]
+		try:
+			errors = Worker([Path(job['source'])], self._config, self._labels, settings, self._robocopy, self._logger,
+				kill = self._kill_switch,
+				echo = self._echo_line
+			).run()
+		except SystemExit:	# service is stopping, job will be resumed on next start
+			self._spool.release(path)
+			self._logger.info(self._labels.job_released.replace('#', f'{path.name}'))
+			return
+		except Exception as ex:
+			errors = [self._logger.error(ex)]
+		if errors is None:	# bad destination
+			errors = [self._labels.bad_destination.replace('#', f'{settings.destination}')]
+		self._spool.finish(path, {'errors': errors}, failed=bool(errors))
+		if errors:
+			self._logger.warning(self._labels.job_failed.replace('#', f'{path.name}'))
+		else:
+			self._logger.info(self._labels.job_finished.replace('#', f'{path.name}'))
+
+	def stop(self):
+		'''Stop taking jobs and abort running ones'''
+		self._kill_switch.set()
+
+	def run(self):
+		'''Watch spool directory until stopped'''
+		self._spool.recover()
+		self._logger.info(self._labels.watching_spool.replace('#', f'{self._spool.queue_path}'))
+		running = set()
+		with ThreadPoolExecutor(max_workers=max(1, self._config.spool_jobs), thread_name_prefix='SpoolJob') as executor:
+			try:
+				while not self._kill_switch.is_set():
+					while len(running) < self._config.spool_jobs and (item := self._spool.take()):
+						running.add(executor.submit(self._run, *item))
+					if running:	# wake up when a job is done or the interval has passed
+						done, running = wait(running, timeout=self._config.spool_interval, return_when=FIRST_COMPLETED)
+						for future in done:
+							if ex := future.exception():
+								self._logger.error(ex)
+					else:
+						self._kill_switch.wait(self._config.spool_interval)
+			except KeyboardInterrupt:
+				self.stop()
+		self._logger.info(self._labels.service_stopped)
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 from threading import Thread, Event
+from queue import Queue, SimpleQueue, Empty
 from tkinter import Tk, PhotoImage, StringVar, BooleanVar
 from tkinter.font import nametofont
 from tkinter.ttk import Frame, Label, Entry, Button, Checkbutton, OptionMenu
@@ -14,7 +15,8 @@ from classes.logger import Logger
 from classes.paths import Path, PathTree
 from classes.json import Json
 from classes.update import Update
-from classes.robocopy import RoboCopy
+from classes.backend import create_backend
+from classes.throttle import Throttle
 
 class WorkThread(Thread):
 	'''Thread that does the work while Tk is running the GUI'''
@@ -24,6 +26,7 @@ class WorkThread(Thread):
 		self._gui = gui
 		super().__init__()
 		self._kill_event = Event()
+		self.errors = True	# kept if the worker raises
 		self._worker = Worker(
 			self._gui.source_paths,
 			self._gui.config,
@@ -37,8 +40,11 @@ class WorkThread(Thread):
 		)
 
 	def run(self):
-		'''Run thread'''
-		self._gui.finished(self._worker.run())
+		'''Run thread, GUI takes the result when it has drained the output'''
+		try:
+			self.errors = self._worker.run()
+		except Exception as ex:
+			self.errors = self._gui.logger.error(ex)
 
 	def kill(self):
 		'''Kill thread'''
@@ -54,6 +60,7 @@ class Gui(Tk):
 		self.labels = labels
 		self.settings = settings
 		self.log_path = user_log
+		self._echo_queue = SimpleQueue()
 		self.logger = Logger(self.config, self.labels, echo=self.echo)
 		try:
 			self._defs = Json(self.config.app_path / 'gui.json')
@@ -141,18 +148,8 @@ class Gui(Tk):
 			self._quit_button = Button(self, text=self.labels.quit, command=self._quit_app)
 			self._quit_button.grid(row=6, column=1, sticky='e', padx=self._pad, pady=self._pad)
 			if not self.config.app_path.resolve().drive.startswith('\\\\'):
-				update = Update(self.labels.version, self.config.update_path)
-				if update.new_version and askyesno(
-					title = self.labels.update_title.replace('#', update.new_version),
-					message = self.labels.update_message
-				):
-					try:
-						update.download(self.config.app_path)
-						self.destroy()
-						return
-					except Exception as ex:
-						msg = self.logger.error(ex)
-						showerror(parent=self, title=self.labels.error, message=f'{self.labels.update_error}:\n{msg}')
+				self._update = Update(self.labels.version, self.config.update_path, timeout=self.config.update_timeout)
+				self.after(100, self._poll_update)
 			if not self.destinations:
 				if self.settings.destination:
 					self._crash(self.labels.bad_destination.replace('#', self.settings.destination))
@@ -162,12 +159,42 @@ class Gui(Tk):
 				self._crash(self.labels.bad_log_dir.replace('#', f'{self.config.log_path}'))
 			if not self.config.mail_path.is_accessable_dir():
 				self._crash(self.labels.bad_mail_dir.replace('#', f'{self.config.mail_path}'))
-			self.robocopy = RoboCopy()
+			self.robocopy = create_backend(self.config.copy_backend,
+				profile = self.config.robocopy_profiles[self.config.robocopy_profile],
+				throttle = Throttle(self.config.bandwidth, self.config.bandwidth_schedule),
+				probe_cache = self.config.local_path / self.config.probe_cache_name,
+				buffer_size = self.config.hash_buffer_size,
+				chunk_threshold = self.config.chunk_threshold,
+				chunk_size = self.config.chunk_size,
+				chunk_threads = self.config.chunk_threads,
+				algorithms = self.config.hash_algorithms
+			)
 			self._work_thread = None
+			self._check_queue = None
+			self._trees = dict()	# validated source trees to be passed to the worker without scanning again
 			self._init_warning()
+			self._drain_echo()
 		except Exception as ex:
 			self._crash(ex)
 
+	def _poll_update(self):
+		'''Ask to download when the background check has found a newer version'''
+		if not self._update.done():
+			if not self._update.expired():
+				self.after(100, self._poll_update)
+			return
+		if self._update.new_version and not self._work_thread and askyesno(
+			title = self.labels.update_title.replace('#', self._update.new_version),
+			message = self.labels.update_message
+		):
+			try:
+				self._update.download(self.config.app_path)
+				self._save_settings()
+				self.destroy()
+			except Exception as ex:
+				msg = self.logger.error(ex)
+				showerror(parent=self, title=self.labels.error, message=f'{self.labels.update_error}:\n{msg}')
+
 	def _crash(self, arg):
 		'''Handle critical error and terminate app'''
 		msg = self.logger.crash(arg)
@@ -193,43 +220,87 @@ class Gui(Tk):
 		if not src_dir:
 			return
 		self._clear_info()
-		source = PathTree(src_dir)
+		source = PathTree(src_dir, scan=False)
 		old_paths, bad_paths = self._get_source_paths()
 		if old_paths and source.path in old_paths:
 			self.logger.info(self.labels.already_added.replace('#', f'{source}'))
 			return
 		self.logger.info(self.labels.checking_source.replace('#', f'{source}'))
-		match, pattern = source.search(self.config.source_whitelist)
-		if not match:
+		self._check_dir(source)
+
+	def _check_dir(self, source):
+		'''Validate directory in a background thread, results are polled from the queue'''
+		self._source_button.configure(state='disabled')
+		self._exec_button.configure(state='disabled')
+		self._check_queue = Queue()
+		Thread(target=self._validate, args=(source, self._check_queue, self.settings.tolerant), daemon=True).start()
+		self.after(100, self._poll_check)
+
+	def _validate(self, source, queue, tolerant):
+		'''Scan and check source tree (runs in background thread)'''
+		try:
+			result = source.validate(
+				self.config.source_whitelist,
+				self.config.max_path_length,
+				blacklist = None if tolerant else self.config.source_blacklist,
+				progress = lambda count: queue.put(('progress', count))
+			)
+		except Exception as ex:
+			queue.put(('error', ex))
+		else:
+			queue.put(('done', source, result))
+
+	def _poll_check(self):
+		'''Take messages from the validating thread'''
+		try:
+			while True:
+				item = self._check_queue.get_nowait()
+				if item[0] == 'progress':
+					self.echo(self.labels.paths_checked.replace('#', f'{item[1]}'), end='\r')
+				else:
+					self._check_queue = None
+					self._source_button.configure(state='normal')
+					self._exec_button.configure(state='normal')
+					if item[0] == 'error':
+						showerror(parent=self, title=self.labels.error, message=self.logger.error(item[1]))
+					else:
+						self._checked(*item[1:])
+					return
+		except Empty:
+			self.after(100, self._poll_check)
+
+	def _checked(self, source, result):
+		'''Handle result of validation'''
+		if not result:
+			self._trees[source.path] = source
+			self._source_text.insert('end', f'{source}\n')
+			self.logger.info(self.labels.inserted.replace('#', f'{source}'))
+			return
+		key, match, value = result
+		if key == 'bad_source':
 			showerror(
 				parent = self,
 				title = self.labels.error,
 				message = self.logger.error(self.labels.bad_source.replace('#', f'{source}'))
 			)
-			return
-		match, length = source.too_long(self.config.max_path_length)
-		if match:
-			msd = self.logger.warning(self.labels.path_too_long.replace(
+		elif key == 'path_too_long':
+			msg = self.logger.warning(self.labels.path_too_long.replace(
 					'#1', f'{match}').replace(
-					'#2', f'{length}').replace(
-					'#3', f'{self._config.max_path_length}')
+					'#2', f'{value}').replace(
+					'#3', f'{self.config.max_path_length}')
 			)
 			showerror(parent=self, title=self.labels.error, message=msg)
-			return
-		if not self.settings.tolerant:
-			match, pattern = source.search(self.config.source_blacklist)
-			if match:
-				msg = self.logger.warning(self.labels.blacklisted.replace('#1', f'{match}').replace('#2', f'{pattern}'))
-				showwarning(parent=self, title=self.labels.warning, message=msg)
-				if not askyesno(parent=self, title=self.labels.warning, message=self.labels.ask_ignore):
-					self.settings.tolerant = False
-					return
-				if not askyesno(title=self.labels.warning, message=self.labels.are_you_sure):
-					self.settings.tolerant = False
-					return
-				self.settings.tolerant = True
-		self._source_text.insert('end', f'{source}\n')
-		self.logger.info(self.labels.inserted.replace('#', f'{source}'))
+		else:
+			msg = self.logger.warning(self.labels.blacklisted.replace('#1', f'{match}').replace('#2', f'{value}'))
+			showwarning(parent=self, title=self.labels.warning, message=msg)
+			if not askyesno(parent=self, title=self.labels.warning, message=self.labels.ask_ignore):
+				self.settings.tolerant = False
+				return
+			if not askyesno(title=self.labels.warning, message=self.labels.are_you_sure):
+				self.settings.tolerant = False
+				return
+			self.settings.tolerant = True
+			self._check_dir(source)	# validation goes on after the blacklisted path
 
 	def _select_dir(self):
 		'''Select directory to add into field'''
@@ -257,16 +328,42 @@ class Gui(Tk):
 				self.log_path = None
 
 	def echo(self, *args, end=None):
-		'''Write message to info field (ScrolledText)'''
-		msg = ' '.join(f'{arg}' for arg in args)
-		self._info_text.configure(state='normal')
-		if not self._info_newline:
-			self._info_text.delete('end-2l', 'end-1l')
-		self._info_text.insert('end', f'{msg}\n')
-		self._info_text.configure(state='disabled')
-		if self._info_newline:
+		'''Queue message for info field, may be called from any thread'''
+		self._echo_queue.put((' '.join(f'{arg}' for arg in args), end))
+
+	def _drain_echo(self):
+		'''Write queued messages to info field (ScrolledText) in batches of up to scrollback lines, lines ending with \\r are overwritten'''
+		work_thread = self._work_thread
+		lines = list()
+		replace = False
+		newline = self._info_newline
+		drained = False
+		for dummy in range(self._defs.scrollback):
+			try:
+				msg, end = self._echo_queue.get_nowait()
+			except Empty:
+				drained = True
+				break
+			if not newline:	# previous line was progress
+				if lines:
+					lines.pop()
+				else:
+					replace = True
+			lines.append(msg)
+			newline = end != '\r'
+		if lines:
+			self._info_text.configure(state='normal')
+			if replace:
+				self._info_text.delete('end-2l', 'end-1l')
+			self._info_text.insert('end', '\n'.join(lines) + '\n')
+			if (excess := int(self._info_text.index('end-1c').split('.')[0]) - 1 - self._defs.scrollback) > 0:
+				self._info_text.delete('1.0', f'{excess + 1}.0')
+			self._info_text.configure(state='disabled')
 			self._info_text.yview('end')
-		self._info_newline = end != '\r'
+			self._info_newline = newline
+		if drained and work_thread and not work_thread.is_alive():	# all output of the worker has been written
+			self.finished(work_thread.errors)
+		self.after(self._defs.echo_interval, self._drain_echo)
 
 	def _clear_info(self):
 		'''Clear info text'''
@@ -295,7 +392,8 @@ class Gui(Tk):
 	def _execute(self):
 		'''Start copy process / worker'''
 		self._clear_info()
-		self.source_paths, bad_paths = self._get_source_paths()
+		source_paths, bad_paths = self._get_source_paths()
+		self.source_paths = [self._trees.get(path, path) for path in source_paths]
 		if bad_paths:
 			showerror(title=self.labels.error, message=f'{self.labels.bad_sources}: {"\n ".join(bad_paths)}')
 		if not self.source_paths:
@@ -315,7 +413,8 @@ class Gui(Tk):
 		self._source_button.configure(state='disabled')
 		self._source_text.configure(state='disabled')
 		self._exec_button.configure(state='disabled')
-		self._work_thread = WorkThread(self).start()
+		self._work_thread = WorkThread(self)
+		self._work_thread.start()
 
 	def _init_warning(self):
 		'''Init warning functionality'''
@@ -354,6 +453,7 @@ class Gui(Tk):
 		self.write_log.set(False)
 		self.log_path = None
 		self.settings.tolerant = False
+		self._trees = dict()
 		self._work_thread = None
 		self._source_button.configure(state='normal')
 		self._exec_button.configure(state='normal')
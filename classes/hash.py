@@ -1,28 +1,80 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from threading import Thread
-from hashlib import file_digest
+from threading import Thread, Lock, local
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import new as new_digest
 
-class HashThread(Thread):
-	'''Calculate hashes'''
+class HashPool:
+	'''Calculate hashes in a pool of worker threads, one future per file'''
+
+	def __init__(self, workers=1, buffer_size=1048576, throttle=None, algorithms=('md5',)):
+		'''Start thread pool, throttle limits reading, algorithms are names as used by hashlib'''
+		for algorithm in algorithms:	# raise ValueError on unknown algorithm before starting
+			new_digest(algorithm)
+		self.algorithms = tuple(algorithms)
+		self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='Hash')
+		self._throttle = throttle
+		self._buffer_size = buffer_size
+		self._buffers = local()
+		self._lock = Lock()
+		self.files_done = 0
+		self.bytes_done = 0
+
+	def hash(self, path):
+		'''Calculate hashes of file in one read using a large buffer, return hex digests in order of algorithms'''
+		try:
+			buffer = self._buffers.buffer
+		except AttributeError:
+			buffer = self._buffers.buffer = bytearray(self._buffer_size)
+		view = memoryview(buffer)
+		digests = [new_digest(algorithm) for algorithm in self.algorithms]
+		with path.open('rb', buffering=0) as fh:
+			while size := fh.readinto(buffer):
+				if self._throttle:
+					self._throttle.consume(size)
+				for digest in digests:	# hashlib releases the GIL
+					digest.update(view[:size])
+				with self._lock:
+					self.bytes_done += size
+		with self._lock:
+			self.files_done += 1
+		return tuple(digest.hexdigest() for digest in digests)
+
+	def submit(self, path):
+		'''Start hashing of file, return future'''
+		return self._executor.submit(self.hash, path)
 
-	@staticmethod
-	def md5(path):
-		'''Calculate md5 hash of file'''
-		with path.open('rb') as fh:
-			return file_digest(fh, 'md5').hexdigest()
+	def shutdown(self, cancel=False):
+		'''Stop thread pool'''
+		self._executor.shutdown(wait=not cancel, cancel_futures=cancel)
 
-	def __init__(self, file_paths):
-		'''Generate object to calculate hashes'''
+class HashThread(Thread):
+	'''Calculate hashes of a list of files in the background'''
+
+	def __init__(self, file_paths, workers=1, buffer_size=1048576, throttle=None, algorithms=('md5',)):
+		'''Generate object to calculate hashes, throttle limits reading'''
 		super().__init__()
 		self.file_paths = file_paths
+		self._pool = HashPool(workers=workers, buffer_size=buffer_size, throttle=throttle, algorithms=algorithms)
+
+	@property
+	def files_done(self):
+		'''Return number of hashed files'''
+		return self._pool.files_done
+
+	@property
+	def bytes_done(self):
+		'''Return number of hashed bytes'''
+		return self._pool.bytes_done
 
 	def run(self):
 		'''Calculate hashes'''
-		self.hashes = [self.md5(path) for path in self.file_paths]
+		futures = [self._pool.submit(path) for path in self.file_paths]
+		self.hashes = [future.result() for future in futures]
+		self._pool.shutdown()
 
 	def get_hashes(self):
-		'''Return relative paths and hashes'''
-		for path, md5 in zip(self.file_paths, self.hashes):
-			yield path, md5
+		'''Return paths and hex digests'''
+		for path, digests in zip(self.file_paths, self.hashes):
+			yield path, digests
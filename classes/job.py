@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from time import perf_counter
+
+class CopyJob:
+	'''State of one source directory from copying to finishing'''
+
+	def __init__(self, source, destination, backend, metrics):
+		'''Generate object to pass results between stages'''
+		self.source = source
+		self.destination = destination
+		self.backend = backend
+		self.metrics = metrics
+		self.start_time = perf_counter()
+		self.copied = False
+		self.copy_end = None	# perf_counter when the backend has finished
+		self.hash_end = None	# perf_counter when all files are hashed
+		self.failed = False	# destination is not complete, do not trigger further processing
+		self.pipeline = None	# task of the stages that go on after copying
+		self.tsv_path = None
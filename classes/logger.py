@@ -2,9 +2,17 @@
 # -*- coding: utf-8 -*-
 
 import logging
+from atexit import register
+from logging.handlers import QueueHandler
 from time import strftime
+from contextvars import ContextVar
 from traceback import format_exc
 from sys import exc_info
+from classes.tsv import TsvWriter
+from classes.logwriter import LogWriter, BatchFileHandler
+from classes.size import Size
+
+_job = ContextVar('job', default=None)	# follows threads and asyncio tasks of a job
 
 class Logger:
 	'''Configure Logging'''
@@ -15,42 +23,83 @@ class Logger:
 		self._labels = labels
 		self._echo = echo
 		self._lastlog_path = self._config.local_path.joinpath(self._config.lastlog_name)
-		self._remote = None
+		self._spool_path = self._config.local_path.joinpath(self._config.log_spool_name)
+		self._remotes = dict()
 		self._user = None
 		self._logger = logging.getLogger()
 		self._logger.setLevel(logging.DEBUG)
+		self._logger.addFilter(self._tag)
+		self._writer = LogWriter(interval=self._config.log_interval)	# file handlers are run by the writer thread
+		register(self._writer.stop)
+		self._logger.addHandler(QueueHandler(self._writer.queue))
 		self._formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 		self._lastlog = self._add(self._lastlog_path, logging.DEBUG)
+		self._writer.queue.put((self._replay_spool,))
 		logging.info(f'{self._labels.starting} "{self._labels.title}" v{self._labels.version}, {self._labels.user_label} "{self._labels.user}"')
 
-	def _add(self, path, level):
-		'''Add log file'''
-		handler = logging.FileHandler(mode='w', filename=path)
+	def _add(self, path, level, remote=False, job=None):
+		'''Add log file, files in the log directory (network share) are written in batches and spooled locally if not accessable'''
+		if remote:
+			handler = BatchFileHandler(path, self._spool_path.joinpath(path.parent.name, path.name),
+				batch = self._config.log_batch,
+				interval = self._config.log_interval
+			)
+		else:
+			handler = logging.FileHandler(mode='w', filename=path)
 		handler.setFormatter(self._formatter)
 		handler.setLevel(level)
-		self._logger.addHandler(handler)
+		if job:
+			handler.addFilter(lambda record: getattr(record, 'job', None) in (None, job))
+		self._writer.add(handler)
 		return handler
 
+	def _replay_spool(self):
+		'''Append records spooled by previous runs to their remote log files (in writer thread), keep them if still not accessable'''
+		for spool_path in self._spool_path.glob('*/*'):
+			try:
+				remote_path = self._config.log_path.joinpath(spool_path.parent.name, spool_path.name)
+				remote_path.parent.mkdir(parents=True, exist_ok=True)
+				with remote_path.open('a', encoding='utf-8') as fh:
+					fh.write(spool_path.read_text(encoding='utf-8'))
+				spool_path.unlink()
+			except OSError:
+				continue
+
+	def _tag(self, record):
+		'''Tag log record with the job (name of source directory) of the calling thread or task'''
+		record.job = _job.get()
+		return True
+
+	def set_job(self, name):
+		'''Set job of the calling thread or task so its messages go to the matching remote log'''
+		_job.set(name)
+
 	def get_ts(self):
 		'''Get timestamp'''
 		return strftime('%y%m%d_%H%M%S')
 
 	def add_remote(self, src_dir_path):
 		'''Add remote log file'''
-		self._remote_path = self._config.log_path.joinpath(src_dir_path.name, f'{self.get_ts()}_{self._config.log_name}')
+		name = src_dir_path.name
+		remote_path = self._config.log_path.joinpath(name, f'{self.get_ts()}_{self._config.log_name}')
 		try:
-			self._remote_path.parent.mkdir(parents=True, exist_ok=True)
-			self._remote = self._add(self._remote_path, logging.DEBUG)
+			remote_path.parent.mkdir(parents=True, exist_ok=True)
+			handler = self._add(remote_path, logging.DEBUG, remote=True, job=name)
+			self._writer.queue.put((self._replay_spool,))	# log share is accessable again
 		except Exception as ex:
 			self.crash(ex)
 		else:
+			self._remotes[name] = handler
+			self.set_job(name)
 			logging.info(f'{self._labels.user_label} {self._labels.user}, {self._labels.source_dir}: {src_dir_path}')
 
-	def close_remote(self):
-		'''Close remote log file'''
-		if self._remote:
-			self._logger.removeHandler(self._remote)
-			self._remote.close()
+	def close_remote(self, name=None):
+		'''Close remote log file of given source directory or all'''
+		for key in (name,) if name else tuple(self._remotes):
+			if handler := self._remotes.pop(key, None):
+				self._writer.remove(handler)
+		if _job.get() == name:
+			_job.set(None)
 
 	def add_user(self, log_path, sources):
 		'''Add user log file with given path if not inside path to copy'''
@@ -68,8 +117,8 @@ class Logger:
 		if not self._user:
 			return
 		logging.debug('Closing user log')
-		self._logger.removeHandler(self._user)
-		self._user.close()
+		self._writer.remove(self._user, wait=True)
+		self._user = None
 		if self._tmp_path:
 			try:
 				self._user_path.write_bytes(self._tmp_path.read_bytes())
@@ -110,16 +159,39 @@ class Logger:
 		msg = self._decode(arg)
 		self._echo(f'CRITICAL: {msg}')
 		logging.critical(msg)
-		self.close_remote()
-		self.close_user()
-		self._logger.removeHandler(self._lastlog)
-		self._lastlog.close()
+		self.close()
 		logging.shutdown()
 		self._config.log_path.joinpath(f'{self.get_ts()}_{self._config.crashlog_name}').write_bytes(self._lastlog_path.read_bytes())
 		return msg
 
-	def write_tsv(self, tsv, destination):
-		'''Write TSV file'''
+	def close(self):
+		'''Close remote and user logs, write all queued records and stop writer thread'''
+		self.close_remote()
+		self.close_user()
+		self._writer.stop()
+
+	def open_tsv(self, destination, src_dir_name, algorithms=('md5',)):
+		'''Open TSV file in log and destination directory to write row by row, one hash column per algorithm'''
 		name = f'{self.get_ts()}_{self._config.tsv_name}'
-		self._remote_path.parent.joinpath(name).write_text(tsv, encoding='utf-8')
-		destination.write_text_file(name, tsv)
+		head = self._labels.tsv_head.replace('#', '\t'.join(f'{algorithm.upper()}-Hash' for algorithm in algorithms))
+		return TsvWriter((self._config.log_path.joinpath(src_dir_name, name), destination.joinpath(name)), head)
+
+	def log_spans(self, metrics):
+		'''Log timing spans'''
+		for span in metrics.spans:
+			logging.info(self._labels.stage_timing.replace(
+				'#1', span['stage']).replace(
+				'#2', f'{span["seconds"]:.3f}').replace(
+				'#3', f'{span["files"]}').replace(
+				'#4', Size(span['bytes']).readable(format_k='{iec}'))
+			)
+
+	def write_metrics(self, destination, src_dir_name, metrics):
+		'''Log timing spans and write them as JSON file next to the TSV files'''
+		self.log_spans(metrics)
+		name = f'{self.get_ts()}_{self._config.metrics_name}'
+		for path in self._config.log_path.joinpath(src_dir_name, name), destination.joinpath(name):
+			try:
+				metrics.write(path)
+			except Exception as ex:
+				self.warning(self._labels.metrics_error.replace('#', f'{ex}'))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+from time import monotonic
+from queue import SimpleQueue, Empty
+from threading import Thread, Event
+
+class BatchFileHandler(logging.Handler):
+	'''Append records to a file (e.g. on a network share) in batches, spool locally while the file cannot be written'''
+
+	def __init__(self, path, spool_path, level=logging.NOTSET, batch=500, interval=2):
+		'''Buffer formatted records, write when batch is full or interval (seconds) has passed'''
+		super().__init__(level)
+		self.path = path
+		self.spool_path = spool_path
+		self._batch = batch
+		self._interval = interval
+		self._lines = list()
+		self._last = monotonic()
+
+	def emit(self, record):
+		'''Buffer record'''
+		self._lines.append(self.format(record))
+		if len(self._lines) >= self._batch:
+			self.flush()
+
+	def due(self):
+		'''Return True if buffered records are older than interval'''
+		return self._lines and monotonic() - self._last >= self._interval
+
+	def _write(self, path, text):
+		'''Append text to file'''
+		with path.open('a', encoding='utf-8') as fh:
+			fh.write(text)
+
+	def flush(self):
+		'''Write buffered records, spooled ones first, spool if the file is not accessable'''
+		self._last = monotonic()
+		if not self._lines and not self.spool_path.exists():
+			return
+		text = ''.join(f'{line}\n' for line in self._lines)
+		self._lines.clear()
+		try:
+			if self.spool_path.exists():	# file was not accessable before
+				self._write(self.path, self.spool_path.read_text(encoding='utf-8'))
+				self.spool_path.unlink()
+			self._write(self.path, text)
+		except OSError:
+			try:
+				self.spool_path.parent.mkdir(parents=True, exist_ok=True)
+				self._write(self.spool_path, text)
+			except OSError as ex:
+				logging.lastResort.handle(logging.makeLogRecord({'msg': f'Unable to write log {self.path}: {ex}', 'levelno': logging.ERROR}))
+
+	def close(self):
+		'''Write what is left'''
+		self.flush()
+		super().close()
+
+class LogWriter(Thread):
+	'''Take records from a queue (filled by logging.handlers.QueueHandler) and pass them to the handlers in the background'''
+
+	def __init__(self, interval=2):
+		'''Start thread, due batches are flushed every interval seconds'''
+		super().__init__(name='LogWriter', daemon=True)
+		self.queue = SimpleQueue()
+		self._interval = interval
+		self._handlers = list()
+		self.start()
+
+	def _dispatch(self, item):
+		'''Handle record or run command (handler management and sync) in order of the queue'''
+		if isinstance(item, logging.LogRecord):
+			for handler in self._handlers:
+				if item.levelno >= handler.level:
+					handler.handle(item)
+		else:
+			function, *args = item
+			function(*args)
+
+	def _add(self, handler):
+		'''Add handler (in writer thread)'''
+		self._handlers.append(handler)
+
+	def _remove(self, handler):
+		'''Remove and close handler (in writer thread)'''
+		if handler in self._handlers:
+			self._handlers.remove(handler)
+		handler.close()
+
+	def run(self):
+		'''Process queue until stopped'''
+		running = True
+		while running:
+			try:
+				item = self.queue.get(timeout=self._interval)
+			except Empty:
+				item = None
+			if item is None:
+				pass
+			elif item is self:	# stop
+				running = False
+			else:
+				self._dispatch(item)	# errors of handlers are handled by logging
+			for handler in self._handlers:
+				if isinstance(handler, BatchFileHandler) and handler.due():
+					handler.flush()
+		for handler in self._handlers:
+			handler.close()
+		self._handlers.clear()
+
+	def add(self, handler):
+		'''Add handler for the records that are queued from now on'''
+		self.queue.put((self._add, handler))
+
+	def remove(self, handler, wait=False):
+		'''Remove and close handler after all queued records have been written'''
+		self.queue.put((self._remove, handler))
+		if wait:
+			self.sync()
+
+	def sync(self):
+		'''Wait until all queued records have been passed to the handlers'''
+		if self.is_alive():
+			done = Event()
+			self.queue.put((done.set,))
+			done.wait()
+
+	def stop(self):
+		'''Write everything, close handlers and end thread'''
+		if self.is_alive():
+			self.queue.put(self)
+			self.join()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from os import scandir
+from array import array
+from bisect import bisect_left
+
+class Manifest:
+	'''Listing of a directory tree that is built by one single scan, stored in compact columns:
+		directory table (relative prefixes), names, parent directory IDs, sizes, mtimes, digests and statuses
+	'''
+
+	OKAY, MISSING, BAD_SIZE, BAD_HASH = 1, 2, 3, 4	# values of statuses, 0 = not checked
+
+	def __init__(self, root, scan=True):
+		'''Scan directory tree, scan=False leaves it to the caller to consume walk()'''
+		self.root = root
+		self.file_count = 0
+		self.total_bytes = 0
+		self._dirs = ['']	# relative prefix of each directory ID, '' is the root
+		self._dir_ids = None
+		self._starts = array('q', [0])	# entries of a directory are stored as one range, sorted by name
+		self._ends = array('q', [0])
+		self._parents = array('L')
+		self._names = list()
+		self._sizes = array('q')
+		self._mtimes = array('d')
+		self._is_dir = bytearray()
+		self._digests = dict()	# algorithm -> (width, bytearray with width bytes per entry, zeros if not set)
+		self.statuses = bytearray()
+		if scan:
+			for entry in self.walk():
+				pass
+
+	def walk(self):
+		'''Scan directory tree using os.scandir, yield (relative path, size, mtime, is_dir) as soon as found'''
+		stack = [(0, f'{self.root}')]
+		while stack:
+			dir_id, dir_path = stack.pop()
+			self._starts[dir_id] = self._ends[dir_id] = len(self._names)
+			try:
+				with scandir(dir_path) as iterator:
+					dir_entries = sorted(iterator, key=lambda entry: entry.name)
+			except OSError:
+				continue
+			prefix = self._dirs[dir_id]
+			sub_dirs = list()
+			for entry in dir_entries:
+				try:
+					is_dir = entry.is_dir()
+					if is_dir and entry.is_symlink():	# linked directories are not copied
+						continue
+					stat = entry.stat()	# size of linked file, not of the link
+				except OSError:
+					continue
+				relative = f'{prefix}{entry.name}'
+				size = 0 if is_dir else stat.st_size
+				self._parents.append(dir_id)
+				self._names.append(entry.name)
+				self._sizes.append(size)
+				self._mtimes.append(stat.st_mtime)
+				self._is_dir.append(is_dir)
+				self.statuses.append(0)
+				self._ends[dir_id] += 1
+				if is_dir:
+					self._dirs.append(f'{relative}/')
+					self._starts.append(0)
+					self._ends.append(0)
+					sub_dirs.append((len(self._dirs) - 1, entry.path))
+				else:
+					self.file_count += 1
+					self.total_bytes += size
+				yield relative, size, stat.st_mtime, is_dir
+			stack.extend(reversed(sub_dirs))
+
+	def __len__(self):
+		'''Return number of entries'''
+		return len(self._names)
+
+	def __iter__(self):
+		'''Iterate over all entries as (relative path, size, mtime, is_dir)'''
+		for index in range(len(self._names)):
+			yield self.relative(index), self._sizes[index], self._mtimes[index], bool(self._is_dir[index])
+
+	def __reversed__(self):
+		'''Iterate over all entries backwards, sub directories come before their parents'''
+		for index in reversed(range(len(self._names))):
+			yield self.relative(index), self._sizes[index], self._mtimes[index], bool(self._is_dir[index])
+
+	def relative(self, index):
+		'''Return relative path of entry'''
+		return f'{self._dirs[self._parents[index]]}{self._names[index]}'
+
+	def path(self, index):
+		'''Return absolute path of entry'''
+		return self.root / self.relative(index)
+
+	def size(self, index):
+		'''Return size of entry'''
+		return self._sizes[index]
+
+	def mtime(self, index):
+		'''Return modification time of entry'''
+		return self._mtimes[index]
+
+	def is_dir(self, index):
+		'''Return True if entry is a directory'''
+		return bool(self._is_dir[index])
+
+	def index(self, relative):
+		'''Return index of entry or None if path is not in manifest'''
+		if self._dir_ids is None:
+			self._dir_ids = {prefix: dir_id for dir_id, prefix in enumerate(self._dirs)}
+		head, slash, name = relative.rpartition('/')
+		if (dir_id := self._dir_ids.get(f'{head}/' if slash else '')) is None:
+			return None
+		index = bisect_left(self._names, name, self._starts[dir_id], self._ends[dir_id])
+		if index < self._ends[dir_id] and self._names[index] == name:
+			return index
+		return None
+
+	def paths(self):
+		'''Yield relative paths of all entries'''
+		for index in range(len(self._names)):
+			yield self.relative(index)
+
+	def file_indexes(self):
+		'''Yield indexes of all files'''
+		for index, is_dir in enumerate(self._is_dir):
+			if not is_dir:
+				yield index
+
+	def files(self):
+		'''Yield relative path, size and mtime of all files'''
+		for index in self.file_indexes():
+			yield self.relative(index), self._sizes[index], self._mtimes[index]
+
+	def get_size(self, relative):
+		'''Return size of file or None if file is not in manifest'''
+		index = self.index(relative)
+		if index is None or self._is_dir[index]:
+			return None
+		return self._sizes[index]
+
+	def set_digest(self, index, algorithm, hexdigest):
+		'''Store hex digest of file'''
+		value = bytes.fromhex(hexdigest)
+		if not algorithm in self._digests:	# columns are created when the scan is complete
+			self._digests[algorithm] = len(value), bytearray(len(value) * len(self._names))
+		width, column = self._digests[algorithm]
+		column[index*width:(index+1)*width] = value
+
+	def get_digest(self, index, algorithm):
+		'''Return hex digest of file or None if not set'''
+		if not algorithm in self._digests:
+			return None
+		width, column = self._digests[algorithm]
+		value = column[index*width:(index+1)*width]
+		return value.hex() if any(value) else None
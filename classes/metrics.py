@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from json import dump
+from time import perf_counter
+from contextlib import contextmanager
+from threading import Lock
+
+class Metrics:
+	'''Collect timing spans of the stages of one job, spans may overlap as stages run concurrently'''
+
+	def __init__(self):
+		'''Start with empty list of spans'''
+		self.spans = list()
+		self._lock = Lock()
+		self._start = perf_counter()
+
+	def add(self, name, start, end, files=0, bytes=0):
+		'''Add span between two values of perf_counter, return it as dict'''
+		span = {'stage': name, 'start': start - self._start, 'seconds': end - start, 'files': files, 'bytes': bytes}
+		with self._lock:
+			self.spans.append(span)
+		return span
+
+	@contextmanager
+	def span(self, name, files=0, bytes=0):
+		'''Measure duration of the enclosed block, files and bytes may be updated in the yielded dict'''
+		span = {'files': files, 'bytes': bytes}
+		start = perf_counter()
+		try:
+			yield span
+		finally:
+			self.add(name, start, perf_counter(), span['files'], span['bytes'])
+
+	def total(self):
+		'''Return wall clock time from the start of the first span to the end of the last'''
+		if not self.spans:
+			return 0
+		return max(span['start'] + span['seconds'] for span in self.spans) - min(span['start'] for span in self.spans)
+
+	def write(self, path):
+		'''Write spans as JSON file'''
+		with path.open('w', encoding='utf-8') as fp:
+			dump({'spans': self.spans, 'seconds': self.total()}, fp, indent=4)
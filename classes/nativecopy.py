@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from classes.pycopy import PyCopy
+try:
+	from os import copy_file_range
+except ImportError:	# not on Windows and macOS
+	copy_file_range = None
+try:
+	from os import sendfile
+except ImportError:
+	sendfile = None
+
+class NativeCopy(PyCopy):
+	'''Copy files inside the kernel (copy_file_range/sendfile) where available, hashes are built separately'''
+
+	hash_while_copy = False
+
+	def __init__(self, buffer_size=8388608, chunk_threshold=0, chunk_size=33554432, chunk_threads=4, throttle=None, algorithms=('md5',)):
+		'''Prepare copy engine'''
+		super().__init__(buffer_size=buffer_size,
+			chunk_threshold = chunk_threshold,
+			chunk_size = chunk_size,
+			chunk_threads = chunk_threads,
+			throttle = throttle,
+			algorithms = algorithms
+		)
+		self._kernel_copy = copy_file_range or sendfile
+
+	def _copy_chunk(self, src_path, dst_path, offset, length):
+		'''Copy one range of a file at given offsets, return number of bytes, fall back to buffered copy if kernel copy is not supported'''
+		done = 0
+		if self._kernel_copy is copy_file_range and copy_file_range:
+			try:
+				with src_path.open('rb', buffering=0) as src_fh, dst_path.open('r+b', buffering=0) as dst_fh:
+					while done < length and (count := copy_file_range(
+						src_fh.fileno(), dst_fh.fileno(), min(length - done, len(self._buffer)), offset + done, offset + done
+					)):
+						if self.throttle:
+							self.throttle.consume(count)
+						done += count
+				return done
+			except OSError:	# e.g. EXDEV or EINVAL, continue the range with buffer
+				self._kernel_copy = None
+		return done + len(super()._copy_chunk(src_path, dst_path, offset + done, length - done))
+
+	def _kernel_stream(self, src_fh, dst_fh, size):
+		'''Copy using system calls without passing data through user space'''
+		src_fd = src_fh.fileno()
+		dst_fd = dst_fh.fileno()
+		step = len(self._buffer) if self.throttle else self._chunk_size	# smaller steps keep throttled throughput even
+		done = 0
+		percent = 0
+		while True:
+			if self._kernel_copy is copy_file_range:
+				count = copy_file_range(src_fd, dst_fd, step)
+			else:
+				count = sendfile(dst_fd, src_fd, None, step)
+			if not count:
+				return True
+			if self.throttle:
+				self.throttle.consume(count)
+			done += count
+			if self._kill.is_set():
+				return None
+			if size and (new_percent := int(100 * done / size)) > percent:
+				percent = new_percent
+				yield f'{percent}%'
+
+	def _stream(self, src_path, dst_path, size):
+		'''Copy file, fall back to buffered copy if kernel copy is not supported'''
+		with src_path.open('rb', buffering=0) as src_fh, dst_path.open('wb', buffering=0) as dst_fh:
+			if self._kernel_copy:
+				try:
+					return (yield from self._kernel_stream(src_fh, dst_fh, size))
+				except OSError:	# e.g. not supported by file system, continue with buffer
+					self._kernel_copy = None
+					src_fh.seek(dst_fh.tell())
+			done = dst_fh.tell()
+			percent = 0
+			while count := src_fh.readinto(self._buffer):
+				if self.throttle:
+					self.throttle.consume(count)
+				dst_fh.write(self._view[:count])
+				done += count
+				if self._kill.is_set():
+					return None
+				if size and (new_percent := int(100 * done / size)) > percent:
+					percent = new_percent
+					yield f'{percent}%'
+		return True
+
+	def clone(self):
+		'''Return new engine for another job'''
+		return NativeCopy(
+			buffer_size = len(self._buffer),
+			chunk_threshold = self._chunk_threshold,
+			chunk_size = self._chunk_size,
+			chunk_threads = self._chunk_threads,
+			throttle = self.throttle,
+			algorithms = self.algorithms
+		)
+
+	def __repr__(self):
+		'''Return engine description'''
+		return f'NativeCopy ({"kernel copy" if self._kernel_copy else f"{len(self._buffer)} bytes buffer"})'
@@ -4,6 +4,9 @@
 from pathlib import Path as PathlibPath
 from re import compile as re_compile
 from re import Pattern as RePattern
+from re import error as ReError
+from functools import lru_cache
+from classes.manifest import Manifest
 
 class Path(PathlibPath):
 	'''Methods to check and create paths'''
@@ -31,27 +34,62 @@ class Path(PathlibPath):
 class RegEx:
 	'''Regular expression for iterable data'''
 
+	@staticmethod
+	@lru_cache(maxsize=32)
+	def get(patterns):
+		'''Return cached checker for given patterns (tuple)'''
+		return RegEx(patterns)
+
 	def __init__(self, patterns):
-		'''Set up checker'''
+		'''Set up checker, combine all patterns into one alternation with named groups'''
 		self._compiled = tuple(re_compile(pattern) for pattern in patterns)
+		self._combined = None
+		if any(regex.groups for regex in self._compiled):	# numbered backreferences would point to other groups
+			return
+		try:
+			self._combined = re_compile('|'.join(f'(?P<p{index}>{regex.pattern})' for index, regex in enumerate(self._compiled)))
+		except ReError:	# e.g. global flags
+			pass
+
+	def _first_pattern(self, item, index):
+		'''Return first given pattern that matches, alternation prefers the leftmost match'''
+		for regex in self._compiled[:index]:
+			if regex.search(item):
+				return regex.pattern
+		return self._compiled[index].pattern
 
 	def search(self, iterable):
 		'''Return first matching item'''
+		if not self._compiled:
+			return None, None
+		if not self._combined:
+			for item in iterable:
+				for regex in self._compiled:
+					if regex.search(item):
+						return item, regex.pattern
+			return None, None
+		search = self._combined.search
 		for item in iterable:
-			for regex in self._compiled:
-				if regex.search(item):
-					return item, regex.pattern
+			if match := search(item):
+				return item, self._first_pattern(item, int(match.lastgroup[1:]))
 		return None, None
 
 class PathTree:
 	'''Tree of paths'''
 
-	def __init__(self, root):
-		'''Set up tree'''
+	def __init__(self, root, scan=True):
+		'''Set up tree, scan=False if validate() is used instead of a full scan'''
 		self.path = Path(root).resolve()
 		self.name = self.path.name
 		self.parent = self.path.parent
-		self._subs = tuple(path.str() for path in self.path.rrglob('*'))
+		self._stopped = None	# state of validation that stopped at a blacklisted path
+		if scan:
+			self.scan()
+
+	def scan(self):
+		'''Scan tree and build manifest (one walk that is used by all checks)'''
+		self.manifest = Manifest(self.path)
+		return self.manifest
 
 	def __str__(self):
 		'''Return string representation'''
@@ -61,9 +99,15 @@ class PathTree:
 		'''Return string representation'''
 		return f"Tree('{self.path}')"
 
-	def walk(self):
-		'''Return all paths in tree'''
-		return self.path.rglob('*')
+	def _subs(self):
+		'''Yield paths relative to parent, built from the manifest when needed'''
+		for relative in self.manifest.paths():
+			yield f'{self.name}/{relative}'
+
+	def files(self):
+		'''Yield path and size of all files in tree'''
+		for relative, size, mtime in self.manifest.files():
+			yield self.path / relative, size
 
 	def get_relative(self, path):
 		'''Return path relative to root'''
@@ -77,16 +121,51 @@ class PathTree:
 		'''Check if path is an excisting, accessable directory'''
 		return self.path.is_accessable_dir()
 
+	def validate(self, whitelist, max_len, blacklist=None, progress=None, interval=10000):
+		'''Scan tree and check every path as soon as it is found, stop at first violation,
+			return (label key, path, length or pattern) or None if valid, manifest is complete only then,
+			progress is called with the number of checked paths every interval paths,
+			after a blacklisted path the next call goes on with the rest of the tree
+		'''
+		whitelist = RegEx.get(tuple(whitelist))
+		blacklist = RegEx.get(tuple(blacklist)) if blacklist else None
+		if self._stopped:
+			manifest, walk, count, whitelisted = self._stopped
+			self._stopped = None
+		else:
+			manifest = Manifest(self.path, scan=False)
+			walk = manifest.walk()
+			count = 0
+			whitelisted = False
+		for relative, size, mtime, is_dir in walk:
+			sub = f'{self.name}/{relative}'
+			if len(sub) > max_len:
+				return 'path_too_long', self.parent / sub, len(sub)
+			if not whitelisted:
+				match, pattern = whitelist.search((sub,))
+				whitelisted = bool(match)
+			if blacklist:
+				match, pattern = blacklist.search((sub,))
+				if match:
+					self._stopped = manifest, walk, count + 1, whitelisted
+					return 'blacklisted', self.parent / match, pattern
+			count += 1
+			if progress and count % interval == 0:
+				progress(count)
+		if not whitelisted:
+			return 'bad_source', self.path, None
+		self.manifest = manifest
+
 	def search(self, patterns):
 		'''Return first path that matches a pattern'''
-		match, pattern = RegEx(patterns).search(self._subs)
+		match, pattern = RegEx.get(tuple(patterns)).search(self._subs())
 		if match:
 			return self.path.parent / match, pattern
 		return None, None
 
 	def too_long(self, max_len):
 		'''Return path that violates given path length (in chars)'''
-		for sub in self._subs:
+		for sub in self._subs():
 			length = len(sub)
 			if length > max_len:
 				return self.path.parent / sub, length
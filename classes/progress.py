@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from time import perf_counter
+
+class Progress:
+	'''Parse copy output (robocopy with /fp /ns /nc) and calculate throughput'''
+
+	def __init__(self, source, window=5):
+		'''Take total size from manifest of source tree, window is given in seconds'''
+		self._root = f'{source.path}'
+		self._manifest = source.manifest
+		self.total_files = source.manifest.file_count
+		self.total_bytes = source.manifest.total_bytes
+		self.current_file = None
+		self.finished = deque()	# manifest indexes of files that are complete, to be taken by the consumer
+		self.files_done = 0
+		self._finished_bytes = 0
+		self._current_index = None
+		self._current_size = 0
+		self._current_bytes = 0
+		self._window = window
+		self._start_time = perf_counter()
+		self._samples = deque([(self._start_time, 0)])
+
+	def _sample(self):
+		'''Remember bytes done for instantaneous throughput'''
+		now = perf_counter()
+		self._samples.append((now, self.bytes_done))
+		while len(self._samples) > 2 and now - self._samples[1][0] > self._window:
+			self._samples.popleft()
+
+	def _file_done(self):
+		'''Count current file as done'''
+		if self.current_file:
+			self.files_done += 1
+			self._finished_bytes += self._current_size
+			if self._current_index is not None:
+				self.finished.append(self._current_index)
+			self.current_file = None
+			self._current_size = 0
+			self._current_bytes = 0
+
+	def feed(self, line):
+		'''Parse one line of output, return True if it is a percent line'''
+		if line.endswith('%'):
+			try:
+				percent = float(line[:-1])
+			except ValueError:
+				return False
+			self._current_bytes = int(self._current_size * percent / 100)
+			self._sample()
+			return True
+		if line.startswith(self._root) and not line.endswith(('\\', '/')):	# file line, directory lines end with separator
+			self._file_done()
+			self.current_file = line
+			self._current_index = self._manifest.index(line[len(self._root)+1:].replace('\\', '/'))
+			self._current_size = self._manifest.size(self._current_index) if self._current_index is not None else 0
+			self._sample()
+		return False
+
+	def finish(self):
+		'''Call when copy process has finished'''
+		self._file_done()
+		self._sample()
+
+	@property
+	def bytes_done(self):
+		'''Return bytes that have been copied'''
+		return self._finished_bytes + self._current_bytes
+
+	def elapsed(self):
+		'''Return seconds since start'''
+		return perf_counter() - self._start_time
+
+	def rate(self):
+		'''Return instantaneous throughput in bytes per second'''
+		(start, start_bytes), (end, end_bytes) = self._samples[0], self._samples[-1]
+		return (end_bytes - start_bytes) / (end - start) if end > start else 0
+
+	def average(self):
+		'''Return average throughput in bytes per second'''
+		elapsed = self.elapsed()
+		return self.bytes_done / elapsed if elapsed > 0 else 0
+
+	def remaining(self):
+		'''Return estimated remaining seconds or None'''
+		average = self.average()
+		if not average:
+			return None
+		return max(0, self.total_bytes - self.bytes_done) / average
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from os import utime, replace
+from threading import Event
+from hashlib import new as new_digest
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from classes.paths import Path, PathTree
+from classes.backend import CopyBackend
+
+class PyCopy(CopyBackend):
+	'''Copy in Python with the interface of RoboCopy, hashes are built while copying'''
+
+	hash_while_copy = True
+
+	def __init__(self, buffer_size=8388608, chunk_threshold=0, chunk_size=33554432, chunk_threads=4, throttle=None, algorithms=('md5',)):
+		'''Prepare copy engine, files larger than chunk_threshold are copied in ranges by multiple threads (0 = never),
+			algorithms are the hashlib names of the digests to build
+		'''
+		self.throttle = throttle
+		self.algorithms = tuple(algorithms)
+		self._buffer = bytearray(buffer_size)
+		self._view = memoryview(self._buffer)
+		self._chunk_threshold = chunk_threshold
+		self._chunk_size = chunk_size
+		self._chunk_threads = chunk_threads
+		self._kill = Event()
+		self.returncode = 0
+
+	def _new_digests(self):
+		'''Return one hashlib object per algorithm'''
+		return [new_digest(algorithm) for algorithm in self.algorithms]
+
+	def _store_digests(self, manifest, index, hexdigests):
+		'''Store hex digests of file in manifest'''
+		for algorithm, hexdigest in zip(self.algorithms, hexdigests):
+			manifest.set_digest(index, algorithm, hexdigest)
+
+	def _stream(self, src_path, dst_path, size):
+		'''Read source once, write destination and feed all digests, yield progress in percent'''
+		digests = self._new_digests()
+		done = 0
+		percent = 0
+		with src_path.open('rb', buffering=0) as src_fh, dst_path.open('wb') as dst_fh:
+			while count := src_fh.readinto(self._buffer):
+				if self.throttle:
+					self.throttle.consume(count)
+				chunk = self._view[:count]
+				dst_fh.write(chunk)
+				for digest in digests:
+					digest.update(chunk)
+				done += count
+				if self._kill.is_set():
+					return None
+				if size and (new_percent := int(100 * done / size)) > percent:
+					percent = new_percent
+					yield f'{percent}%'
+		return tuple(digest.hexdigest() for digest in digests)
+
+	def _copy_chunk(self, src_path, dst_path, offset, length):
+		'''Copy one range of a file using own file handles, return data for hashing'''
+		with src_path.open('rb', buffering=0) as src_fh, dst_path.open('r+b', buffering=0) as dst_fh:
+			src_fh.seek(offset)
+			data = bytearray()
+			while len(data) < length and (chunk := src_fh.read(min(length - len(data), len(self._buffer)))):
+				if self.throttle:
+					self.throttle.consume(len(chunk))
+				data += chunk
+			dst_fh.seek(offset)
+			dst_fh.write(data)
+		return data
+
+	def _stream_chunked(self, src_path, dst_path, size):
+		'''Copy ranges of a large file in parallel into a part file that replaces the destination only when complete,
+			feed digests in order, yield progress in percent
+		'''
+		part_path = dst_path.with_name(f'{dst_path.name}.part')	# a failed copy must not leave a file of full size
+		with part_path.open('wb') as fh:
+			fh.truncate(size)
+		digests = self._new_digests() if self.hash_while_copy else None
+		offsets = iter(range(0, size, self._chunk_size))
+		pending = deque()
+		done = 0
+		percent = 0
+		try:
+			with ThreadPoolExecutor(max_workers=self._chunk_threads) as executor:
+				try:
+					for offset in offsets:	# limit chunks in memory to twice the number of threads
+						pending.append(executor.submit(self._copy_chunk, src_path, part_path, offset, self._chunk_size))
+						if len(pending) >= 2 * self._chunk_threads:
+							break
+					while pending:
+						result = pending.popleft().result()
+						if (offset := next(offsets, None)) is not None:
+							pending.append(executor.submit(self._copy_chunk, src_path, part_path, offset, self._chunk_size))
+						if digests:
+							for digest in digests:
+								digest.update(result)
+							done += len(result)
+						else:
+							done += result
+						if self._kill.is_set():
+							return None
+						if (new_percent := int(100 * done / size)) > percent:
+							percent = new_percent
+							yield f'{percent}%'
+				finally:
+					for future in pending:
+						future.cancel()
+			if done != size:
+				raise OSError(f'Copied {done} of {size} bytes')
+			replace(part_path, dst_path)
+		finally:
+			part_path.unlink(missing_ok=True)
+		return tuple(digest.hexdigest() for digest in digests) if digests else True
+
+	def _hash(self, src_path):
+		'''Only read and hash source file'''
+		digests = self._new_digests()
+		with src_path.open('rb', buffering=0) as fh:
+			while count := fh.readinto(self._buffer):
+				if self.throttle:
+					self.throttle.consume(count)
+				for digest in digests:
+					digest.update(self._view[:count])
+		return tuple(digest.hexdigest() for digest in digests)
+
+	def _yield(self, src, dst, relatives, purge=False):
+		'''Copy given files, yield output similar to RoboCopy, digests are stored in the manifest of the source tree'''
+		self._kill.clear()
+		src_tree = src if isinstance(src, PathTree) else PathTree(src)
+		manifest = src_tree.manifest
+		dst_path = Path(f'{dst}')
+		copied = 0
+		failed = 0
+		dst_path.mkdir(parents=True, exist_ok=True)
+		for index in range(len(manifest)):
+			relative = manifest.relative(index)
+			if relatives is not None and relative not in relatives:
+				continue
+			if self._kill.is_set():
+				break
+			src_file_path = src_tree.path / relative
+			dst_file_path = dst_path / relative
+			try:
+				if manifest.is_dir(index):
+					dst_file_path.mkdir(parents=True, exist_ok=True)
+					continue
+				size = manifest.size(index)
+				mtime = manifest.mtime(index)
+				yield f'{src_file_path}'
+				try:
+					dst_stat = dst_file_path.stat()
+				except FileNotFoundError:
+					dst_stat = None
+				if dst_stat and dst_stat.st_size == size and dst_stat.st_mtime == mtime:	# same file, robocopy would skip it
+					if self.hash_while_copy and not all(manifest.get_digest(index, algorithm) for algorithm in self.algorithms):	# might be known from previous run
+						self._store_digests(manifest, index, self._hash(src_file_path))
+					continue
+				dst_file_path.parent.mkdir(parents=True, exist_ok=True)
+				if self._chunk_threshold and size > self._chunk_threshold:
+					result = yield from self._stream_chunked(src_file_path, dst_file_path, size)
+				else:
+					result = yield from self._stream(src_file_path, dst_file_path, size)
+				if result:
+					utime(dst_file_path, (mtime, mtime))
+					if self.hash_while_copy:
+						self._store_digests(manifest, index, result)
+					copied += 1
+			except Exception as ex:
+				failed += 1
+				yield f'ERROR: {src_file_path}: {ex}'
+		if purge and not self._kill.is_set():
+			src_relatives = set(src_tree.manifest.paths())
+			for relative, size, mtime, is_dir in reversed(PathTree(dst_path).manifest):
+				if not relative in src_relatives:
+					path = dst_path / relative
+					try:
+						path.rmdir() if is_dir else path.unlink()
+					except Exception as ex:
+						failed += 1
+						yield f'ERROR: {path}: {ex}'
+		self.returncode = (1 if copied else 0) + (8 if failed else 0)
+
+	def copy_dir(self, src, dst):
+		'''Copy recursivly a directory, digests already in the manifest are used for skipped files'''
+		return self._yield(src, dst, None)
+
+	def mirror_dir(self, src, dst):
+		'''Empty destination directory and copy source into it'''
+		return self._yield(src, dst, None, purge=True)
+
+	def copy_files(self, src, dst, filenames):
+		'''Copy files into destination directory'''
+		return self._yield(src, dst, set(filenames))
+
+	def clone(self):
+		'''Return new engine for another job'''
+		return PyCopy(
+			buffer_size = len(self._buffer),
+			chunk_threshold = self._chunk_threshold,
+			chunk_size = self._chunk_size,
+			chunk_threads = self._chunk_threads,
+			throttle = self.throttle,
+			algorithms = self.algorithms
+		)
+
+	def terminate(self):
+		'''Stop copying'''
+		self._kill.set()
+
+	def __repr__(self):
+		'''Return engine description'''
+		return f'PyCopy ({len(self._buffer)} bytes buffer)'
@@ -1,25 +1,105 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import logging
-from subprocess import Popen, PIPE, STDOUT, STARTUPINFO, STARTF_USESHOWWINDOW
+from copy import copy
+from json import load, dump
+from shutil import which
+from collections import deque
+from threading import Thread, Event, Lock
+from subprocess import Popen, PIPE, STDOUT
+try:
+	from subprocess import STARTUPINFO, STARTF_USESHOWWINDOW
+except ImportError:	# not on Windows, robocopy is not available anyway
+	STARTUPINFO = None
+from classes.paths import Path
+from classes.backend import CopyBackend
 
-class RoboCopy:
+class RoboCopy(CopyBackend):
 	'''Wrapper for RoboCopy'''
 
-	def __init__(self):
-		'''Create robocopy process'''
-		self._startupinfo = STARTUPINFO()
-		self._startupinfo.dwFlags |= STARTF_USESHOWWINDOW
+	hash_while_copy = False
+
+	def __init__(self, profile=None, throttle=None, probe_cache=None):
+		'''Create robocopy process, profile is a dict from config.json (e.g. {"mt": 16, "unbuffered": false, "retries": 5, "wait": 5}),
+			probe_cache is a JSON file to keep the supported options between launches
+		'''
+		self.throttle = throttle
+		if STARTUPINFO:
+			self._startupinfo = STARTUPINFO()
+			self._startupinfo.dwFlags |= STARTF_USESHOWWINDOW
+		else:
+			self._startupinfo = None
+		self._proc = None
+		self._ready = Event()
 		self._copy_args = ['/fp', '/ns', '/njh', '/njs', '/nc', '/a-:R']
+		self.options = self._cached_options(probe_cache)
+		for option in '/unicode', '/compress':
+			if option in self.options:
+				self._copy_args.append(option)
+		if profile:
+			self._copy_args.extend(self._profile_args(profile))
+		self.ordered_output = not any(arg.startswith('/mt') for arg in self._copy_args)	# threads print files as they start
+
+	def _probe(self):
+		'''Parse help text of robocopy to get supported options'''
+		options = set()
 		try:
 			for line in self._yield(['/?']):
-				if line.lstrip().lower().startswith('/unicode'):
-					self._copy_args.append('/unicode')
-				elif line.lower().startswith('/compress'):
-					self._copy_args.append('/compress')
+				if line.startswith('/'):	# e.g. "/MT[:n] :: Do multi-threaded copies..."
+					options.add(line.split(maxsplit=1)[0].split('[')[0].split(':')[0].lower())
 		except Exception as ex:
 			raise RuntimeError(f'Unable to execute "robocopy /?":\n{ex}')
+		return options
+
+	def _cached_options(self, cache_path):
+		'''Return options from cache if robocopy executable has not changed since it was probed'''
+		if not cache_path or not (executable := which('robocopy')):
+			return self._probe()
+		try:
+			key = {'executable': executable, 'mtime': Path(executable).stat().st_mtime}
+		except OSError:
+			return self._probe()
+		try:
+			with cache_path.open(encoding='utf-8') as fp:
+				cached = load(fp)
+			if cached['executable'] == key['executable'] and cached['mtime'] == key['mtime']:
+				return set(cached['options'])
+		except Exception:	# not probed yet or unreadable
+			pass
+		options = self._probe()
+		try:
+			with cache_path.open('w', encoding='utf-8') as fp:
+				dump(key | {'options': sorted(options)}, fp)
+		except OSError:
+			pass
+		return options
+
+	def _profile_args(self, profile):
+		'''Build arguments from copy profile, skip what the local robocopy does not support'''
+		args = list()
+		if profile.get('mt') and '/mt' in self.options:
+			args.append(f'/mt:{profile["mt"]}')
+		if profile.get('unbuffered') and '/j' in self.options:
+			args.append('/j')
+		if profile.get('retries') is not None and '/r' in self.options:
+			args.append(f'/r:{profile["retries"]}')
+		if profile.get('wait') is not None and '/w' in self.options:
+			args.append(f'/w:{profile["wait"]}')
+		return args
+
+	def _throttle_args(self, bandwidth):
+		'''Translate bandwidth limit into inter packet gap, robocopy sends blocks of 64 KiB'''
+		if not bandwidth:
+			return list()
+		return [f'/ipg:{max(1, int(65536000 / bandwidth))}']
+
+	def _copy(self, args):
+		'''Execute RoboCopy with a share of the bandwidth reserved from the throttle until it has finished'''
+		if not self.throttle or not '/ipg' in self.options:
+			yield from self._yield(args)
+			return
+		with self.throttle.reserve() as bandwidth:
+			yield from self._yield(args + self._throttle_args(bandwidth))
 
 	def _popen(self, args):
 		'''Use Popen to run RoboCopy'''
@@ -33,25 +113,67 @@ class RoboCopy:
 			startupinfo = self._startupinfo
 		)
 
+	def _read(self, proc, lines, lock, done):
+		'''Drain output of the process into buffer (runs in own thread), only the latest progress line is kept,
+			file and error lines are never dropped
+		'''
+		try:
+			for line in proc.stdout:
+				if stripped := line.strip():
+					with lock:
+						if lines and lines[-1].endswith('%'):	# not read yet, superseded by newer line
+							lines[-1] = stripped
+						else:
+							lines.append(stripped)
+					self._ready.set()
+		finally:
+			done.set()	# before waking the consumer so it cannot miss the last lines
+			self._ready.set()
+
 	def _yield(self, args):
-		'''Execute RoboCopy and yield output'''
-		proc = self._popen(args)
-		for line in proc.stdout:
-			if stripped := line.strip():
-				yield stripped
-		self.returncode = proc.wait()
+		'''Execute RoboCopy and yield output, a reader thread keeps the pipe empty so a slow consumer does not slow down robocopy'''
+		self._proc = self._popen(args)
+		lines = deque()
+		lock = Lock()
+		done = Event()
+		self._ready.clear()
+		Thread(target=self._read, args=(self._proc, lines, lock, done), daemon=True).start()
+		while True:
+			self._ready.wait()
+			self._ready.clear()
+			finished = done.is_set()
+			with lock:
+				batch = tuple(lines)
+				lines.clear()
+			yield from batch
+			if finished:
+				break
+		self.returncode = self._proc.wait()
 
 	def copy_dir(self, src, dst):
 		'''Copy recursivly a directory'''
-		return self._yield([f'{src}', f'{dst}'] + ['/e'] + self._copy_args)
+		return self._copy([f'{src}', f'{dst}'] + ['/e'] + self._copy_args)
 
 	def mirror_dir(self, src, dst):
 		'''Empty destination directory and copy source into it'''
-		return self._yield([src, dst] + ['/mir'] + self._copy_args)
+		return self._copy([src, dst] + ['/mir'] + self._copy_args)
 
 	def copy_files(self, src, dst, filenames):
 		'''Copy files into destination directory'''
-		return self._yield([src, dst] + filenames + self._copy_args)
+		return self._copy([src, dst] + filenames + self._copy_args)
+
+	def terminate(self):
+		'''Terminate running robocopy process'''
+		if self._proc and self._proc.poll() is None:
+			self._proc.terminate()
+		self._ready.set()
+
+	def clone(self):
+		'''Return new object with the same arguments for another job'''
+		clone = copy(self)
+		clone._proc = None
+		clone._ready = Event()
+		return clone
 
 	def __repr__(self):
 		'''Return command line as string'''
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from json import load, dump
+from time import strftime
+from uuid import uuid4
+
+class Spool:
+	'''Persistent job queue as directory of JSON files (queue -> running -> done / failed)'''
+
+	def __init__(self, path):
+		'''Create sub directories if not existing'''
+		self.path = path
+		self.queue_path = path / 'queue'
+		self.running_path = path / 'running'
+		self.done_path = path / 'done'
+		self.failed_path = path / 'failed'
+		for dir_path in self.queue_path, self.running_path, self.done_path, self.failed_path:
+			dir_path.mkdir(parents=True, exist_ok=True)
+
+	def submit(self, **job):
+		'''Write job file to queue, return path'''
+		name = f'{strftime("%y%m%d_%H%M%S")}_{uuid4().hex}.json'
+		tmp_path = self.path / f'{name}.tmp'
+		with tmp_path.open('w', encoding='utf-8') as fp:
+			dump(job, fp)
+		return tmp_path.replace(self.queue_path / name)	# rename so a watching service never reads a partial file
+
+	def recover(self):
+		'''Move jobs that were running when the service stopped back to the queue'''
+		for path in self.running_path.glob('*.json'):
+			path.replace(self.queue_path / path.name)
+
+	def take(self):
+		'''Move oldest job to running, return (path, job) or None if the queue is empty'''
+		for path in sorted(self.queue_path.glob('*.json')):
+			try:
+				path = path.replace(self.running_path / path.name)
+			except OSError:	# taken by another process
+				continue
+			try:
+				with path.open(encoding='utf-8') as fp:
+					return path, load(fp)
+			except Exception as ex:
+				self.finish(path, {'errors': [f'{ex}']}, failed=True)
+
+	def release(self, path):
+		'''Put running job back into the queue'''
+		return path.replace(self.queue_path / path.name)
+
+	def finish(self, path, result, failed=False):
+		'''Add result to job file and move it to done or failed'''
+		try:
+			with path.open(encoding='utf-8') as fp:
+				job = load(fp)
+		except Exception:
+			job = dict()
+		job.update(result)
+		with path.open('w', encoding='utf-8') as fp:
+			dump(job, fp)
+		return path.replace((self.failed_path if failed else self.done_path) / path.name)
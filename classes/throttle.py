@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from threading import Lock
+from contextlib import contextmanager
+from time import perf_counter, sleep, localtime
+
+class Throttle:
+	'''Limit bandwidth, one object can be shared by multiple threads'''
+
+	def __init__(self, bandwidth=0, schedule=None):
+		'''Set limit in bytes per second, 0 means unlimited,
+			schedule is a list of time windows, e.g. [{"from": "07:00", "to": "18:00", "bandwidth": 20000000}]
+		'''
+		self.bandwidth = bandwidth
+		self._schedule = [
+			(self._minutes(window['from']), self._minutes(window['to']), window['bandwidth'])
+			for window in schedule or ()
+		]
+		self._lock = Lock()
+		self._next = perf_counter()
+		self._reserved = 0	# fraction of the limit given to external processes
+
+	@staticmethod
+	def _minutes(hhmm):
+		'''Convert "HH:MM" to minutes since midnight'''
+		hours, minutes = hhmm.split(':')
+		return int(hours) * 60 + int(minutes)
+
+	def current(self):
+		'''Return limit for the current time of day'''
+		if not self._schedule:
+			return self.bandwidth
+		now = localtime()
+		minutes = now.tm_hour * 60 + now.tm_min
+		for start, end, bandwidth in self._schedule:
+			if start <= minutes < end or end < start and (minutes >= start or minutes < end):	# window may pass midnight
+				return bandwidth
+		return self.bandwidth
+
+	@contextmanager
+	def reserve(self):
+		'''Reserve half of the unreserved limit for an external process (robocopy) while the context is active,
+			yield its limit in bytes per second or 0 if unlimited
+		'''
+		with self._lock:
+			share = (1 - self._reserved) / 2
+			self._reserved += share
+		try:
+			yield int(self.current() * share)
+		finally:
+			with self._lock:
+				self._reserved -= share
+
+	def consume(self, count):
+		'''Wait until given number of bytes may pass, reserved shares are not available'''
+		if not (bandwidth := self.current()):
+			return
+		with self._lock:
+			bandwidth *= 1 - self._reserved
+			now = perf_counter()
+			self._next = max(self._next, now) + count / bandwidth
+			delay = self._next - now
+		if delay > 0:
+			sleep(delay)
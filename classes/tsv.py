@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from os import replace
+
+class TsvWriter:
+	'''Write TSV row by row into one or more files, they get their names only when complete'''
+
+	def __init__(self, paths, head):
+		'''Open part files and write head'''
+		self.paths = paths
+		self._part_paths = [path.with_name(f'{path.name}.part') for path in self.paths]
+		self._files = list()
+		try:
+			for path in self._part_paths:
+				self._files.append(path.open('w', encoding='utf-8'))
+		except:
+			self.discard()
+			raise
+		self._write(head)
+
+	def _write(self, text):
+		'''Write text to all files'''
+		for fh in self._files:
+			fh.write(text)
+
+	def add(self, *columns):
+		'''Write one row'''
+		self._write('\n' + '\t'.join(columns))
+
+	def close(self):
+		'''Close all files and give them their final names'''
+		for fh in self._files:
+			fh.close()
+		for part_path, path in zip(self._part_paths, self.paths):
+			replace(part_path, path)
+
+	def discard(self):
+		'''Close and remove incomplete files'''
+		for fh in self._files:
+			fh.close()
+		for part_path in self._part_paths:
+			part_path.unlink(missing_ok=True)
+
+	def __enter__(self):
+		'''Use as context manager'''
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		'''Close files when leaving context, remove them if writing did not finish'''
+		if exc_type:
+			self.discard()
+		else:
+			self.close()
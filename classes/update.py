@@ -2,24 +2,160 @@
 # -*- coding: utf-8 -*-
 
 from re import sub
+from os import replace
+from json import load, dump
+from time import monotonic
+from threading import Thread, Event
+from hashlib import new as new_digest
 from subprocess import Popen
+from concurrent.futures import ThreadPoolExecutor
+
+class Release:
+	'''Manifest of the files of a published version, relative destination path -> source path, size and hash'''
+
+	name = 'release.json'
+	dist_dir = 'cirdan.dist'
+	extra_files = ('appicon.png', 'config.json', 'gui.json', 'labels.json', 'mail.json', 'LICENSE', 'README.md')	# from root dir
+	algorithm = 'sha256'
+	buffer_size = 1048576
+
+	def __init__(self, version=None, files=None):
+		'''Create empty or given manifest'''
+		self.version = version
+		self.files = files or dict()
+
+	@classmethod
+	def _hash(cls, path):
+		'''Return size and hex digest of file'''
+		with path.open('rb') as fh:
+			digest = new_digest(cls.algorithm)
+			size = 0
+			while chunk := fh.read(cls.buffer_size):
+				digest.update(chunk)
+				size += len(chunk)
+		return size, digest.hexdigest()
+
+	@classmethod
+	def build(cls, src_path, version, workers=8):
+		'''Hash the files of the distribution in the given directory'''
+		sources = {
+			path.relative_to(src_path / cls.dist_dir).as_posix(): path.relative_to(src_path).as_posix()
+			for path in src_path.joinpath(cls.dist_dir).rglob('*') if path.is_file()
+		}
+		sources |= {name: name for name in cls.extra_files if src_path.joinpath(name).is_file()}
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			hashes = dict(zip(sources, executor.map(lambda source: cls._hash(src_path / source), sources.values())))
+		return cls(version, {
+			relative: {'source': source, 'size': hashes[relative][0], 'hash': hashes[relative][1]}
+			for relative, source in sorted(sources.items())
+		})
+
+	@classmethod
+	def load(cls, path):
+		'''Read manifest from JSON file, return None if there is none'''
+		try:
+			with path.open(encoding='utf-8') as fp:
+				manifest = load(fp)
+		except FileNotFoundError:
+			return None
+		if manifest.get('algorithm', cls.algorithm) != cls.algorithm:
+			raise ValueError(f'{path} uses unsupported hash algorithm {manifest["algorithm"]}')
+		return cls(manifest.get('version'), manifest['files'])
+
+	def write(self, path):
+		'''Write manifest as JSON file'''
+		with path.open('w', encoding='utf-8') as fp:
+			dump({'version': self.version, 'algorithm': self.algorithm, 'files': self.files}, fp, indent=1)
+
+	def _unchanged(self, dst_path, relative):
+		'''Return True if installed file matches the manifest'''
+		entry = self.files[relative]
+		path = dst_path / relative
+		try:
+			if path.stat().st_size != entry['size']:
+				return False
+			return self._hash(path) == (entry['size'], entry['hash'])
+		except OSError:
+			return False
+
+	def _fetch(self, src_path, dst_path, relative):
+		'''Copy one file, hash while copying and replace installed file only if it matches the manifest'''
+		entry = self.files[relative]
+		path = dst_path / relative
+		part_path = path.with_name(f'{path.name}.part')
+		path.parent.mkdir(parents=True, exist_ok=True)
+		digest = new_digest(self.algorithm)
+		size = 0
+		try:
+			with src_path.joinpath(entry['source']).open('rb') as src_fh, part_path.open('wb') as dst_fh:
+				while chunk := src_fh.read(self.buffer_size):
+					dst_fh.write(chunk)
+					digest.update(chunk)
+					size += len(chunk)
+			if size != entry['size'] or digest.hexdigest() != entry['hash']:
+				raise ValueError(f'{entry["source"]} does not match {self.name}')
+			replace(part_path, path)
+		finally:
+			part_path.unlink(missing_ok=True)
+		return relative
+
+	def fetch(self, src_path, dst_path, workers=8, echo=print):
+		'''Copy changed files in parallel, remove files of the installed release that are not part of this one'''
+		installed = Release.load(dst_path / self.name)
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			changed = [
+				relative for relative, unchanged in zip(self.files,
+					executor.map(lambda relative: self._unchanged(dst_path, relative), self.files)
+				) if not unchanged
+			]
+			echo(f'{len(changed)} of {len(self.files)} file(s) to download')
+			errors = list()
+			for future in [executor.submit(self._fetch, src_path, dst_path, relative) for relative in changed]:
+				try:
+					echo(future.result())
+				except Exception as ex:
+					errors.append(f'{ex}')
+		if errors:
+			raise ChildProcessError('Problems while downloading:\n' + '\n'.join(errors))
+		if installed:
+			for relative in installed.files.keys() - self.files.keys():
+				dst_path.joinpath(relative).unlink(missing_ok=True)
+		self.write(dst_path / self.name)	# last, so an interrupted update is checked again
+		return changed
 
 class Update:
 	'''Check for new version and start download if available'''
 
-	def __init__(self, this_version, src_path):
-		'''Check for newer version'''
+	def __init__(self, this_version, src_path, timeout=10):
+		'''Check for newer version in background, give up after timeout in seconds'''
+		self._this_version = this_version
 		self._src_path = src_path
-		try:
-			new_version = self._src_path.joinpath('version.txt').read_text(encoding='utf-8')
-		except:
-			self.new_version = None
-			return
-		self.new_version = new_version if self._int(new_version) > self._int(this_version) else None
+		self._deadline = monotonic() + timeout
+		self._done = Event()
+		self.new_version = None
+		Thread(target=self._check, daemon=True).start()	# a slow share must not block the caller
 
 	def _int(self, string):
 		return int(sub(r'[^0-9]', '', string))
 
+	def _check(self):
+		'''Read version of published release'''
+		try:
+			new_version = self._src_path.joinpath('version.txt').read_text(encoding='utf-8').strip()
+			if self._int(new_version) > self._int(self._this_version):
+				self.new_version = new_version
+		except:
+			pass
+		self._done.set()
+
+	def done(self):
+		'''Return True if check has finished'''
+		return self._done.is_set()
+
+	def expired(self):
+		'''Return True if check has timed out'''
+		return not self._done.is_set() and monotonic() > self._deadline
+
 	def download(self, install_path):
 		'''Launch update downloader'''
 		exe_path = self._src_path / 'download_app.dist' / 'download_app.exe'
@@ -28,5 +164,3 @@ class Update:
 			cmd + [self._src_path, install_path],
 			start_new_session=True
 		)
-
-
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from threading import local
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import new as new_digest
+from classes.throttle import Throttle
+
+class VerifyPool:
+	'''Read back destination files in a pool of threads and compare with source hashes'''
+
+	def __init__(self, workers=2, buffer_size=1048576, throttle=None, algorithm='md5'):
+		'''Start thread pool, throttle may be shared with copying and hashing'''
+		self._executor = ThreadPoolExecutor(max_workers=max(1, workers))
+		self._algorithm = algorithm
+		self._buffer_size = buffer_size
+		self._buffers = local()
+		self.throttle = throttle or Throttle()
+
+	def _check(self, dst_path, expected):
+		'''Hash destination file and compare'''
+		try:
+			buffer = self._buffers.buffer
+		except AttributeError:
+			buffer = self._buffers.buffer = bytearray(self._buffer_size)
+		view = memoryview(buffer)
+		digest = new_digest(self._algorithm)
+		try:
+			with dst_path.open('rb', buffering=0) as fh:
+				while size := fh.readinto(buffer):
+					self.throttle.consume(size)
+					digest.update(view[:size])
+		except OSError:
+			return False
+		return digest.hexdigest() == expected
+
+	def verify(self, dst_path, expected):
+		'''Start verification of one destination file, the future gives True if the hash matches'''
+		return self._executor.submit(self._check, dst_path, expected)
+
+	def shutdown(self, cancel=False):
+		'''Stop thread pool'''
+		self._executor.shutdown(wait=not cancel, cancel_futures=cancel)
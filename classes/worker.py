@@ -2,11 +2,17 @@
 # -*- coding: utf-8 -*-
 
 import logging
-from time import sleep, perf_counter
+import asyncio
+from time import perf_counter
 from datetime import timedelta
 from classes.paths import PathTree
-from classes.hash import HashThread
+from classes.hash import HashPool
+from classes.verify import VerifyPool
+from classes.cache import ManifestCache
+from classes.job import CopyJob
 from classes.size import Size
+from classes.progress import Progress
+from classes.metrics import Metrics
 from classes.jsonmail import JsonMail 
 
 class Worker:
@@ -25,101 +31,470 @@ class Worker:
 		self._echo = echo
 		self._mail_address = f'{self._settings.user}@{self._config.domain}' if self._settings.user else None
 		self._user = f'{self._labels.user} / {self._mail_address}' if self._mail_address else self._labels.user
+		self._algorithms = tuple(self._config.hash_algorithms)	# first one is used for verification
+		self._verify_pool = None
+		self._cache = None
+		self._concurrent = False
+		self._metrics = dict()
 		self.errors = list()
 
 	def _error(self, arg):
 		'''Handle error'''
 		self.errors.append(self._logger.error(arg))
 
-	def _copy(self, source, destination):
-		'''Copy directory'''
-		start_time = perf_counter()
-		self._logger.info(f'{self._labels.reading_structure} {source}')
-		src_file_paths = list()
-		src_file_sizes = list()
-		total_bytes = Size(0)
-		for path in source.walk():	# analyze root structure
-			if path.is_file():
-				size = path.stat().st_size
-				src_file_paths.append(path)
-				src_file_sizes.append(size)
-				total_bytes += size
-		hash_thread = HashThread(src_file_paths)
-		self._logger.info(self._labels.starting_hashing.replace('#', f'{len(src_file_paths)}'))
-		hash_thread.start()
-		self._logger.info(f'{self._labels.starting_robocopy}: {source} -> {destination}, {total_bytes.readable()}')
-		for line in self._robocopy.copy_dir(source, destination):
-			if line.endswith('%'):
-				self._echo(line, end='\r')
-			else:
-				self._echo(line)
-			if self._kill_switch and self._kill_switch.is_set():
-				self._robocopy.terminate()
+	def _echo_job(self, job, msg, end=None):
+		'''Echo output of a job, prefix source name when jobs run concurrently'''
+		self._echo(f'{job.source.name}: {msg}' if self._concurrent else msg, end=end)
+
+	def _progress_msg(self, progress):
+		'''Generate message from copy progress'''
+		remaining = progress.remaining()
+		return self._labels.progress.replace(
+			'#1', f'{progress.files_done}').replace(
+			'#2', f'{progress.total_files}').replace(
+			'#3', Size(progress.bytes_done).readable(format_k='{iec}')).replace(
+			'#4', Size(progress.total_bytes).readable(format_k='{iec}')).replace(
+			'#5', f'{progress.rate()/1000000:.1f}').replace(
+			'#6', f'{progress.average()/1000000:.1f}').replace(
+			'#7', f'{timedelta(seconds=int(remaining))}' if remaining is not None else '?')
+
+	CHECKED, HASHED = 1, 2	# flags to join size check and hashing of a file
+
+	@staticmethod
+	def _when_done(loop, queue, future, *item):
+		'''Put item and future into queue as soon as the future of a thread pool is done'''
+		future.add_done_callback(lambda future: loop.call_soon_threadsafe(queue.put_nowait, (*item, future)))
+
+	@staticmethod
+	def _read_output(loop, lines, iterator):
+		'''Pass output of copy backend into queue (runs in own thread), None marks the end'''
+		try:
+			for line in iterator:
+				loop.call_soon_threadsafe(lines.put_nowait, line)
+		finally:
+			loop.call_soon_threadsafe(lines.put_nowait, None)
+
+	@staticmethod
+	def _get_sizes(destination, relatives):
+		'''Return sizes of destination files, None if a file is missing'''
+		sizes = list()
+		for relative in relatives:
+			try:
+				sizes.append(destination.joinpath(relative).stat().st_size)
+			except OSError:
+				sizes.append(None)
+		return sizes
+
+	def _take_finished(self, job, progress, copied):
+		'''Pass files the backend has completed to the size check'''
+		while progress.finished:
+			index = progress.finished.popleft()
+			if job.backend.ordered_output:	# otherwise all files are checked after copying
+				copied.put_nowait(index)
+
+	async def _watch_kill(self, robocopy):
+		'''Terminate backend as soon as the kill switch is set, also while it does not print anything'''
+		while not self._kill_switch.is_set():
+			await asyncio.sleep(.1)
+		robocopy.terminate()
+
+	async def _copy_stage(self, job, copied):
+		'''Run copy backend in a thread and process its output'''
+		source = job.source
+		destination = job.destination
+		robocopy = job.backend
+		loop = asyncio.get_running_loop()
+		lines = asyncio.Queue()
+		self._logger.info(f'{self._labels.starting_robocopy}: {source} -> {destination}, {Size(source.manifest.total_bytes).readable()}')
+		progress = Progress(source)
+		logged = 0
+		watcher = asyncio.create_task(self._watch_kill(robocopy)) if self._kill_switch else None
+		with job.metrics.span('robocopy') as span:
+			try:
+				reader = loop.run_in_executor(None, self._read_output, loop, lines, robocopy.copy_dir(source, destination))
+				while (line := await lines.get()) is not None:
+					if progress.feed(line):
+						self._echo_job(job, f'{line}  {self._progress_msg(progress)}', end='\r')
+					else:
+						self._echo_job(job, line)
+					self._take_finished(job, progress, copied)
+					if self._config.progress_interval and progress.elapsed() - logged >= self._config.progress_interval:
+						self._logger.info(self._progress_msg(progress))
+						logged = progress.elapsed()
+				await reader
+			finally:
+				if watcher:
+					watcher.cancel()
+			if self._kill_switch and self._kill_switch.is_set():	# backend has been terminated
 				raise SystemExit(self._labels.worker_killed)
+			progress.finish()
+			self._take_finished(job, progress, copied)
+			span['files'] = progress.files_done
+			span['bytes'] = progress.bytes_done
+		job.copy_end = perf_counter()
+		copied.put_nowait(None)
+		self._logger.info(self._labels.throughput.replace(
+			'#1', f'{progress.files_done}').replace(
+			'#2', Size(progress.bytes_done).readable()).replace(
+			'#3', f'{progress.average()/1000000:.1f}')
+		)
 		try:
-			robocopy_msg = f'{self._robocopy.returncode} - ' + self._labels.__dict__[f'returncode_{self._robocopy.returncode}']
+			robocopy_msg = f'{robocopy.returncode} - ' + self._labels.__dict__[f'returncode_{robocopy.returncode}']
 		except KeyError:
-			robocopy_msg = f'{self._robocopy.returncode}'
+			robocopy_msg = f'{robocopy.returncode}'
 		robocopy_msg = self._labels.robocopy_returned.replace('#', robocopy_msg)
-		if self._robocopy.returncode > 5:
+		if robocopy.returncode > 5:
 			self._logger.warning(robocopy_msg)
 		else:
 			self._logger.info(robocopy_msg)
+
+	async def _check_stage(self, job, copied, checked):
+		'''Compare sizes of files as soon as they are copied, the rest is checked by one scan after copying'''
+		manifest = job.source.manifest
 		self._logger.info(self._labels.starting_size_check)
-		missing_paths = list()
-		bad_paths = list()
-		total = len(src_file_paths)
-		for cnt, (src_file_path, src_size) in enumerate(zip(src_file_paths, src_file_sizes), start=1):
-			self._echo(f'{int(100*cnt/total)}%', end='\r')
-			dst_file_path = destination.joinpath(source.get_relative(src_file_path))
-			if not dst_file_path.exists():
-				self._logger.warning(self._labels.missing_file.replace('#', f'{src_file_path}'))
-				missing_paths.append(src_file_path)
-				continue
-			dst_size = dst_file_path.stat().st_size
-			if dst_size != src_size:
-				self._logger.warning(self._labels.mismatching_sizes.replace('#', f'{src_file_path} => {src_size}, {dst_file_path} => {dst_size}'))
-				bad_paths.append(src_file_path)
+		while True:
+			batch = [await copied.get()]
+			while not copied.empty():
+				batch.append(copied.get_nowait())
+			if indexes := [index for index in dict.fromkeys(batch) if index is not None and not manifest.statuses[index]]:	# retries may report a file again
+				dst_sizes = await asyncio.to_thread(self._get_sizes, job.destination, [manifest.relative(index) for index in indexes])
+				for index, dst_size in zip(indexes, dst_sizes):
+					if dst_size == manifest.size(index):	# mismatches might be fixed by retries of the backend
+						manifest.statuses[index] = manifest.OKAY
+						checked.put_nowait(index)
+			if batch[-1] is None:	# copying is finished
+				break
+		pending = [index for index in manifest.file_indexes() if not manifest.statuses[index]]
+		with job.metrics.span('size_check', files=len(pending)):	# files that are left after copying
+			if pending:
+				dst_manifest = await asyncio.to_thread(job.destination.scan)	# one walk through destination instead of stat per file
+				for index in pending:
+					relative = manifest.relative(index)
+					src_size = manifest.size(index)
+					dst_size = dst_manifest.get_size(relative)
+					if dst_size is None:
+						self._logger.warning(self._labels.missing_file.replace('#', f'{manifest.path(index)}'))
+						manifest.statuses[index] = manifest.MISSING
+					elif dst_size != src_size:
+						self._logger.warning(self._labels.mismatching_sizes.replace('#', f'{manifest.path(index)} => {src_size}, {job.destination.joinpath(relative)} => {dst_size}'))
+						manifest.statuses[index] = manifest.BAD_SIZE
+					else:
+						manifest.statuses[index] = manifest.OKAY
+					checked.put_nowait(index)
+		checked.put_nowait(None)
 		self._logger.info(self._labels.size_check_finished)
-		if hash_thread.is_alive():
-			self._logger.info(self._labels.hashing_in_progress)
-			index = 0
-			while hash_thread.is_alive():
-				self._echo(f'{"|/-\\"[index]}  ', end='\r')
-				index += 1
-				if index > 3:
-					index = 0
-				sleep(.25)
-		hash_thread.join()
-		self._logger.info(self._labels.hashing_finished)
-		tsv = self._labels.tsv_head
-		for path, md5 in hash_thread.get_hashes():
-			tsv += f'\n{path.relative_to(source.parent)}\t{md5}\t'
-			if path in missing_paths:
-				tsv += self._labels.missing
-			elif path in bad_paths:
-				tsv += self._labels.bad_size
+
+	def _has_digests(self, manifest, index):
+		'''Return True if all digests of file are in manifest'''
+		return all(manifest.get_digest(index, algorithm) for algorithm in self._algorithms)
+
+	def _hashed(self, job, flags, hashed, index, slots, future):
+		'''Store digest from hash pool (in event loop), pass file on if its size check is done'''
+		if slots:
+			slots.release()
+		if future.cancelled():
+			return
+		if ex := future.exception():
+			hashed.put_nowait(ex)
+			return
+		for algorithm, hexdigest in zip(self._algorithms, future.result()):
+			job.source.manifest.set_digest(index, algorithm, hexdigest)
+		flags[index] |= self.HASHED
+		if flags[index] & self.CHECKED:
+			hashed.put_nowait(index)
+
+	def _submit_hash(self, job, flags, hashed, hash_pool, index, slots=None):
+		'''Hash source file in pool'''
+		loop = asyncio.get_running_loop()
+		hash_pool.submit(job.source.manifest.path(index)).add_done_callback(
+			lambda future: loop.call_soon_threadsafe(self._hashed, job, flags, hashed, index, slots, future)
+		)
+
+	async def _feed_hashes(self, job, flags, hashed, hash_pool):
+		'''Hash source files while copying, limit number of files waiting in the pool'''
+		manifest = job.source.manifest
+		slots = asyncio.Semaphore(2 * max(1, self._config.hash_workers))
+		for index in manifest.file_indexes():
+			if self._has_digests(manifest, index):	# from cache
+				continue
+			await slots.acquire()
+			self._submit_hash(job, flags, hashed, hash_pool, index, slots=slots)
+
+	async def _hash_stage(self, job, flags, checked, hashed, hash_pool):
+		'''Pass each checked file to verification as soon as its hash is ready'''
+		manifest = job.source.manifest
+		while (index := await checked.get()) is not None:
+			flags[index] |= self.CHECKED
+			if flags[index] & self.HASHED or self._has_digests(manifest, index):	# hashed, from cache or built while copying
+				hashed.put_nowait(index)
+			elif job.backend.hash_while_copy:	# backend did not copy file
+				self._submit_hash(job, flags, hashed, hash_pool, index)
+
+	async def _verify_stage(self, job, hashed, rows, hash_pool):
+		'''Start verification of a file as soon as its hash is ready, pass other files directly to the TSV'''
+		manifest = job.source.manifest
+		loop = asyncio.get_running_loop()
+		for count in range(manifest.file_count):
+			index = await hashed.get()
+			if isinstance(index, Exception):
+				raise index
+			if self._verify_pool and manifest.statuses[index] == manifest.OKAY:
+				self._when_done(loop, rows, self._verify_pool.verify(
+					job.destination.joinpath(manifest.relative(index)), manifest.get_digest(index, self._algorithms[0])), index)
 			else:
-				tsv += self._labels.okay
-		self._logger.write_tsv(tsv, destination)
-		if missing_paths:
-			self._error(self._labels.error_missing.replace('#', f'{len(missing_paths)}'))
-		if bad_paths:
-			self._error(self._labels.error_sizes.replace('#', f'{len(bad_paths)}'))
-		time_delta = perf_counter() - start_time
+				rows.put_nowait((index, None))
+		job.hash_end = self._waited(job, 'hash_wait', job.copy_end, files=hash_pool.files_done, bytes=hash_pool.bytes_done)
+		self._logger.info(self._labels.hashing_finished)
+
+	async def _tsv_stage(self, job, rows):
+		'''Write row of a file as soon as its hash and verification are done'''
+		manifest = job.source.manifest
+		status_labels = {
+			manifest.OKAY: self._labels.okay,
+			manifest.MISSING: self._labels.missing,
+			manifest.BAD_SIZE: self._labels.bad_size,
+			manifest.BAD_HASH: self._labels.bad_hash
+		}
+		echoed = 0
+		with self._logger.open_tsv(job.destination, job.source.name, self._algorithms) as tsv:
+			for count in range(1, manifest.file_count + 1):
+				index, verified = await rows.get()
+				path = manifest.path(index)
+				if verified and not verified.result():
+					self._logger.warning(self._labels.mismatching_hashes.replace('#', f'{path}'))
+					manifest.statuses[index] = manifest.BAD_HASH
+				tsv.add(f'{path.relative_to(job.source.parent)}',
+					*(manifest.get_digest(index, algorithm) for algorithm in self._algorithms),
+					status_labels[manifest.statuses[index]]
+				)
+				if job.copied and perf_counter() - echoed >= .25:	# robocopy output is done, show what is left
+					self._echo_job(job, f'{count}/{manifest.file_count}  ', end='\r')
+					echoed = perf_counter()
+			if self._verify_pool:
+				self._waited(job, 'verify_wait', job.copy_end, job.hash_end, files=manifest.file_count)
+			written = perf_counter()
+		job.tsv_path = tsv.paths[-1]
+		job.metrics.add('tsv', written, perf_counter(), files=manifest.file_count)
+		if self._verify_pool:
+			self._logger.info(self._labels.verification_finished)
+		if self._cache:
+			try:
+				with job.metrics.span('cache', files=manifest.file_count):
+					await asyncio.to_thread(self._store_cache, job.source)
+			except Exception as ex:
+				self._logger.warning(ex)
+
+	def _waited(self, job, name, *after, files=0, bytes=0):
+		'''Add span for the time a stage took beyond the given perf_counter values (e.g. end of copying), return now'''
+		now = perf_counter()
+		start = max((value for value in after if value), default=now)
+		job.metrics.add(name, min(start, now), now, files=files, bytes=bytes)
+		return now
+
+	async def _pipeline(self, stages, hash_pool):
+		'''Wait for the stages that follow copying, stop all if one fails'''
+		try:
+			await asyncio.gather(*stages)
+		except BaseException:
+			for stage in stages:
+				stage.cancel()
+			raise
+		finally:
+			hash_pool.shutdown(cancel=True)
+
+	async def _copy(self, job):
+		'''Copy directory, size check, hashing, verification and TSV run as tasks linked by queues,
+			return when copying is done while job.pipeline goes on with the other stages
+		'''
+		source = job.source
+		robocopy = job.backend
+		self._logger.info(f'{self._labels.reading_structure} {source}')
+		cached = await asyncio.to_thread(self._load_cache, source) if self._cache else 0
+		if cached:
+			self._logger.info(self._labels.cached_hashes.replace('#', f'{cached}'))
+		hash_pool = HashPool(
+			workers = self._config.hash_workers,
+			buffer_size = self._config.hash_buffer_size,
+			throttle = robocopy.throttle,
+			algorithms = self._algorithms
+		)
+		flags = bytearray(len(source.manifest))
+		copied = asyncio.Queue()	# indexes of copied files
+		checked = asyncio.Queue()	# indexes of files with status from size check
+		hashed = asyncio.Queue()	# indexes of checked files with digest
+		rows = asyncio.Queue()	# (index, future of verification or None)
+		stages = [
+			asyncio.create_task(self._check_stage(job, copied, checked)),
+			asyncio.create_task(self._hash_stage(job, flags, checked, hashed, hash_pool)),
+			asyncio.create_task(self._verify_stage(job, hashed, rows, hash_pool)),
+			asyncio.create_task(self._tsv_stage(job, rows))
+		]
+		if not robocopy.hash_while_copy:	# hash source files while copying
+			self._logger.info(self._labels.starting_hashing.replace('#', f'{source.manifest.file_count - cached}'))
+			stages.append(asyncio.create_task(self._feed_hashes(job, flags, hashed, hash_pool)))
+		if self._verify_pool:
+			self._logger.info(self._labels.starting_verification.replace('#', f'{source.manifest.file_count}'))
+		if robocopy.throttle and (bandwidth := robocopy.throttle.current()):
+			self._logger.info(self._labels.bandwidth_limit.replace('#', f'{bandwidth/1000000:.1f}'))
+		job.pipeline = asyncio.create_task(self._pipeline(stages, hash_pool))
+		try:
+			await self._copy_stage(job, copied)
+		except BaseException:
+			job.pipeline.cancel()
+			job.pipeline = None
+			for stage in stages:
+				stage.cancel()
+			hash_pool.shutdown(cancel=True)
+			if self._cache:	# keep what has been hashed if copying is interrupted
+				self._store_cache(source, replace=False)
+			raise
+		job.copied = True
+		if not robocopy.hash_while_copy and hash_pool.files_done < source.manifest.file_count - cached:
+			self._logger.info(self._labels.hashing_in_progress)
+		if self._verify_pool:
+			self._logger.info(self._labels.verification_in_progress)
+
+	def _load_cache(self, source):
+		'''Take digests of files that are unchanged since previous run into the manifest, return number of files'''
+		manifest = source.manifest
+		for relative, size, mtime, algorithm, hexdigest in self._cache.load(source):
+			if algorithm in self._algorithms and (index := manifest.index(relative)) is not None and not manifest.is_dir(index) and (
+				manifest.size(index), manifest.mtime(index)) == (size, mtime):
+				manifest.set_digest(index, algorithm, hexdigest)
+		return sum(1 for index in manifest.file_indexes() if self._has_digests(manifest, index))
+
+	def _store_cache(self, source, replace=True):
+		'''Store digests of all hashed files to resume later runs'''
+		manifest = source.manifest
+		self._cache.store(source, (
+			(manifest.relative(index), manifest.size(index), manifest.mtime(index), algorithm, hexdigest)
+			for index in manifest.file_indexes()
+			for algorithm in self._algorithms
+			if (hexdigest := manifest.get_digest(index, algorithm))
+		), replace=replace)
+
+	def _report(self, job):
+		'''Log result of copied directory'''
+		manifest = job.source.manifest
+		if missing := manifest.statuses.count(manifest.MISSING):
+			self._error(self._labels.error_missing.replace('#', f'{missing}'))
+		if bad_sizes := manifest.statuses.count(manifest.BAD_SIZE):
+			self._error(self._labels.error_sizes.replace('#', f'{bad_sizes}'))
+		if bad_hashes := manifest.statuses.count(manifest.BAD_HASH):
+			self._error(self._labels.error_hashes.replace('#', f'{bad_hashes}'))
+		time_delta = perf_counter() - job.start_time
 		self._logger.info(self._labels.copy_finished.replace('#', f'{timedelta(seconds=time_delta)}'))
 
+	def _check_destination(self, source):
+		'''Create destination directory, return tree or None if it cannot be used'''
+		destination = PathTree(self._destination_root_path / source.name)
+		try:
+			new = destination.mk()
+		except Exception as ex:
+			self._error(ex)
+			return
+		if new:
+			match, pattern = destination.search(self._config.source_blacklist)
+			if match:
+				self._error(self._labels.destination_blocked_by.replace('#1', f'{match}').replace('#2', f'{pattern}'))
+				return
+		return destination
+
+	async def _start(self, source):
+		'''Check destination and copy one source directory, return job to be finished'''
+		if self._kill_switch and self._kill_switch.is_set():
+			raise SystemExit(self._labels.worker_killed)
+		metrics = self._metrics.pop(source.path, None) or Metrics()
+		with metrics.span('destination_check'):
+			destination = await asyncio.to_thread(self._check_destination, source)
+		if not destination:
+			return
+		job = CopyJob(source, destination, self._robocopy.clone(), metrics)
+		try:
+			self._logger.add_remote(source.path)	# also sets the job of this task for logging
+		except Exception as ex:
+			self._error(self._labels.log_error.replace('#', f'{ex}'))
+		try:
+			await self._copy(job)
+		except Exception as ex:
+			job.failed = True
+			self._error(ex)
+		return job
+
+	def _deliver(self, job):
+		'''Write metrics and trigger files, send mail and close remote log'''
+		self._logger.write_metrics(job.destination, job.source.name, job.metrics)	# destination is complete before it is triggered
+		delivery = Metrics()	# only logged as metrics.json is already written
+		if self._settings.trigger and not job.failed:
+			try:
+				with delivery.span('trigger'):
+					job.destination.write_text_file(self._config.trigger_name, self._user)
+			except Exception as ex:
+				self._error(ex)
+		if self._settings.qualicheck and not job.failed:
+			try:
+				with delivery.span('qualicheck'):
+					job.destination.write_text_file(self._config.qualicheck_name, self._user)
+			except Exception as ex:
+				self._error(ex)
+		if self._settings.sendmail and self._mail_address:
+			try:
+				with delivery.span('mail'):
+					JsonMail(self._config.app_path / 'mail.json').send(
+						self._config.mail_path.joinpath(f'{self._config.mail_name}_{self._logger.get_ts()}_{self._labels.user}_{job.source.name}.json'),
+						to = self._mail_address,
+						id = job.source.name,
+						tsv = job.tsv_path.read_text(encoding='utf-8') if job.tsv_path else ''
+					)
+			except Exception as ex:
+				self._error(ex)
+		self._logger.log_spans(delivery)
+		try:
+			self._logger.close_remote(job.source.name)
+		except Exception as ex:
+			self._logger.warning(ex)
+
+	async def _finish(self, job):
+		'''Wait for the stages after copying, write report and trigger further processing'''
+		if job.pipeline:
+			try:
+				await job.pipeline
+			except Exception as ex:
+				job.failed = True
+				self._error(ex)
+			else:
+				self._report(job)
+		await asyncio.to_thread(self._deliver, job)
+
+	async def _run_job(self, source, slots):
+		'''Copy when a slot is free, the slot is released for the next job before the pipeline of this job has finished'''
+		async with slots:
+			job = await self._start(source)
+		if job:
+			await self._finish(job)
+
+	async def _run_jobs(self, sources):
+		'''Run jobs concurrently with a limit'''
+		slots = asyncio.Semaphore(max(1, self._config.max_jobs))
+		await asyncio.gather(*(self._run_job(source, slots) for source in sources))
+
 	def run(self):
 		'''Start copy process'''
 		logging.debug('Running worker')
 		sources = list()
 		for src_path in self._src_paths:
-			source = PathTree(src_path)
-			match, pattern = source.search(self._config.source_whitelist)
+			metrics = Metrics()
+			with metrics.span('scan') as span:
+				source = src_path if isinstance(src_path, PathTree) else PathTree(src_path)	# GUI passes trees it has scanned
+				span['files'] = source.manifest.file_count
+				span['bytes'] = source.manifest.total_bytes
+			with metrics.span('whitelist', files=source.manifest.file_count):
+				match, pattern = source.search(self._config.source_whitelist)
 			if not match:
 				self._error(self._labels.bad_source.replace('#', f'{source}'))
 				continue
-			match, length = source.too_long(self._config.max_path_length)
+			with metrics.span('too_long', files=source.manifest.file_count):
+				match, length = source.too_long(self._config.max_path_length)
 			if match:
 				self._error(self._labels.path_too_long.replace(
 					'#1', f'{match}').replace(
@@ -128,10 +503,12 @@ class Worker:
 				)
 				continue
 			if not self._settings.tolerant:
-				match, pattern = source.search(self._config.source_blacklist)
+				with metrics.span('blacklist', files=source.manifest.file_count):
+					match, pattern = source.search(self._config.source_blacklist)
 				if match:
 					self._error(self._labels.blacklisted.replace('#1', f'{match}').replace('#2', f'{pattern}'))
 					continue
+			self._metrics[source.path] = metrics
 			sources.append(source)
 		if not sources:
 			self._error(self._labels.no_sources)
@@ -145,52 +522,27 @@ class Worker:
 		if not self._destination_root_path.is_accessable_dir():
 			self._error(self._labels.bad_destination.replace('#', f'{self._destination_root_path}'))
 			return
-		for source in sources:
-			if self._kill_switch and self._kill_switch.is_set():
-				raise SystemExit(self._labels.worker_killed)
-			destination = PathTree(self._destination_root_path / source.name)
+		if self._config.manifest_cache:
 			try:
-				new = destination.mk()
-			except Exception as ex:
-				self._error(ex)
-				continue
-			if new:
-				match, pattern = destination.search(self._config.source_blacklist)
-				if match:
-					self._error(self._labels.destination_blocked_by.replace('#1', f'{match}').replace('#2', f'{pattern}'))
-					continue
-			try:
-				self._logger.add_remote(src_path)
-			except Exception as ex:
-				self._error(self._labels.log_error.replace('#', f'{ex}'))
-			try:
-				self._copy(source, destination)
-			except Exception as ex:
-				self._error(ex)
-			if self._settings.trigger:
-				try:
-					destination.write_text_file(self._config.trigger_name, self._user)
-				except Exception as ex:
-					self._error(ex)
-			if self._settings.qualicheck:
-				try:
-					destination.write_text_file(self._config.qualicheck_name, self._user)
-				except Exception as ex:
-					self._error(ex)
-			if self._settings.sendmail and self._mail_address:
-				try:
-					JsonMail(self._config.app_path / 'mail.json').send(
-						self._config.mail_path.joinpath(f'{self._config.mail_name}_{self._logger.get_ts()}_{self._labels.user}.json'),
-						to = self._mail_address,
-						id = source.name,
-						tsv = tsv
-					)
-				except Exception as ex:
-					self._error(ex)
-			try:
-				self._logger.close_remote()
+				self._cache = ManifestCache(self._config.local_path / self._config.cache_name)
 			except Exception as ex:
 				self._logger.warning(ex)
+		if self._config.verify:
+			self._verify_pool = VerifyPool(
+				workers = self._config.verify_workers,
+				buffer_size = self._config.hash_buffer_size,
+				throttle = self._robocopy.throttle,
+				algorithm = self._algorithms[0]
+			)
+		self._concurrent = self._config.max_jobs > 1 and len(sources) > 1
+		try:
+			asyncio.run(self._run_jobs(sources))
+		except SystemExit:
+			if self._verify_pool:
+				self._verify_pool.shutdown(cancel=True)
+			raise
+		if self._verify_pool:
+			self._verify_pool.shutdown()
 		try:
 			self._logger.close_user()
 		except Exception as ex:
@@ -1,17 +1,17 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+from os import name as os_name
 from sys import argv
 from pathlib import Path
 from subprocess import Popen
-from classes.robocopy import RoboCopy
+from classes.backend import create_backend
+from classes.update import Release
 
-if __name__ == '__main__':  # start here when run as application
-	src_path = Path(argv[1])
-	sub_path = src_path / 'cirdan.dist'
-	dst_path = Path(argv[2])
-	robocopy = RoboCopy()
-	print('Starting download...')
+def mirror(src_path, dst_path):
+	'''Copy entire distribution, used if the release has no manifest'''
+	sub_path = src_path / Release.dist_dir
+	robocopy = create_backend('robocopy' if os_name == 'nt' else 'native')
 	for line in robocopy.mirror_dir(sub_path, dst_path):	# copy cirdan.dist
 		print(line)
 	if robocopy.returncode > 5:
@@ -20,15 +20,7 @@ if __name__ == '__main__':  # start here when run as application
 		msg += '\nReturncode: {robocopy.returncode}'
 		raise ChildProcessError(msg)
 	first_robocopy = f'{robocopy}'
-	for line in robocopy.copy_files(src_path, dst_path, [	# copy additional files from root dir
-		'appicon.png',
-		'config.json',
-		'gui.json',
-		'labels.json',
-		'mail.json',
-		'LICENSE',
-		'README.md'
-	]):
+	for line in robocopy.copy_files(src_path, dst_path, list(Release.extra_files)):	# copy additional files from root dir
 		print(line)
 	if robocopy.returncode > 5:
 		msg = f'RoboCopy reported problems while downloading files from {src_path}'
@@ -36,8 +28,24 @@ if __name__ == '__main__':  # start here when run as application
 		msg += '\nReturncode: {robocopy.returncode}'
 		raise ChildProcessError(msg)
 	print(f'...done executing the following commands:\n{first_robocopy}\n{robocopy}')
-	try:
-		Popen([dst_path / 'cirdan.exe'], start_new_session=True)
-	except Exception as ex:
-		print(f'{type(ex)}: {ex}')
-		input('Press Enter to close terminal window...')
\ No newline at end of file
+
+if __name__ == '__main__':  # start here when run as application
+	if argv[1] == '--publish':	# write manifest of the release in the given directory
+		src_path = Path(argv[2])
+		version = src_path.joinpath('version.txt').read_text(encoding='utf-8').strip()
+		Release.build(src_path, version).write(src_path / Release.name)
+		print(f'Wrote {src_path / Release.name} for version {version}')
+	else:
+		src_path = Path(argv[1])
+		dst_path = Path(argv[2])
+		print('Starting download...')
+		if release := Release.load(src_path / Release.name):	# only files that differ from the installed ones
+			release.fetch(src_path, dst_path)
+			print(f'...done downloading version {release.version}')
+		else:
+			mirror(src_path, dst_path)
+		try:
+			Popen([dst_path / 'cirdan.exe'], start_new_session=True)
+		except Exception as ex:
+			print(f'{type(ex)}: {ex}')
+			input('Press Enter to close terminal window...')
@@ -10,6 +10,8 @@ rmdir download_app.build /S /Q
 echo Writing Version number to file version.txt
 cirdan.dist\cirdan.exe -v > version.txt
 set /P Version=<version.txt
+echo Writing manifest of file hashes to release.json
+download_app.dist\download_app.exe --publish .\
 mkdir ..\Cirdan_v%Version%
 download_app.dist\download_app.exe .\ ..\Cirdan_v%Version%
 echo Distribution build complete!
@@ -5,7 +5,9 @@ from os import remove
 from os.path import exists
 from shutil import move, rmtree
 import PyInstaller.__main__
+from pathlib import Path
 from cirdan import __version__
+from classes.update import Release
 
 if __name__ == '__main__':	# start here
 	print('Building distribution...')
@@ -37,4 +39,5 @@ if __name__ == '__main__':	# start here
 	remove('download_app.spec')
 	with open('version.txt', 'w') as f:
 		print(__version__, file=f)
+	Release.build(Path('.'), __version__).write(Path(Release.name))
 	print('Done!')
\ No newline at end of file